@@ -58,6 +58,16 @@ tinyengine_status convolve_1x1_s8_fpreq(const q7_t *input,
 		q7_t *output, const uint16_t output_x, const uint16_t output_y,
 		const uint16_t output_ch, q15_t *runtime_buf);
 
+tinyengine_status convolve_1x1_s8_fpreq_add(const q7_t *input,
+		const uint16_t input_x, const uint16_t input_y, const uint16_t input_ch,
+		const q7_t *kernel, const int32_t *bias, const float *scales,
+		const int32_t out_offset, const int32_t input_offset,
+		const int32_t out_activation_min, const int32_t out_activation_max,
+		const q7_t *residual, const float conv_scale, const float residual_scale,
+		const float residual_zero, const float output_scale, const float output_zero,
+		q7_t *output, const uint16_t output_x, const uint16_t output_y,
+		const uint16_t output_ch, q15_t *runtime_buf);
+
 tinyengine_status convolve_1x1_s8_fpreq_bitmask(const q7_t *input,
 		const uint16_t input_x, const uint16_t input_y, const uint16_t input_ch,
 		const q7_t *kernel, const int32_t *bias, const float *scales,
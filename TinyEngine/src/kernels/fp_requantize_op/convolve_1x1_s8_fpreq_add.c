@@ -0,0 +1,271 @@
+/* ----------------------------------------------------------------------
+ * Project: TinyEngine
+ * Title:   convolve_1x1_s8_fpreq_add.c
+ *
+ * Reference papers:
+ *  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+ *  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+ *  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+ * Contact authors:
+ *  - Wei-Ming Chen, wmchen@mit.edu
+ *  - Wei-Chen Wang, wweichen@mit.edu
+ *  - Ji Lin, jilin@mit.edu
+ *  - Ligeng Zhu, ligeng@mit.edu
+ *  - Song Han, songhan@mit.edu
+ *
+ * Target ISA:  ARMv7E-M
+ * -------------------------------------------------------------------- */
+
+#include <math.h>
+#include "arm_nnfunctions.h"
+#include "img2col_element.h"
+#include "tinyengine_function.h"
+
+#define DIM_KER_X (1U)
+#define DIM_KER_Y (1U)
+
+/* requantize the accumulator to the int8 output of the conv, then add the residual the same way as add_fpreq */
+static inline q7_t requantize_add(q31_t sum, const float scale,
+		const int32_t out_offset, const int16_t activation_min,
+		const int16_t activation_max, const q7_t residual,
+		const float conv_scale, const float residual_scale,
+		const float residual_zero, const float output_scale,
+		const float output_zero) {
+	sum = (q31_t) ((float) sum * scale);
+	sum += out_offset;
+	sum = MAX(sum, activation_min);
+	sum = MIN(sum, activation_max);
+
+	float conv_fp = ((float) sum - (float) out_offset) * conv_scale;
+	float residual_fp = ((float) residual - residual_zero) * residual_scale;
+	int clamped_output = (int) round((conv_fp + residual_fp) / output_scale + output_zero);
+	clamped_output = TN_MAX(clamped_output, -128);
+	clamped_output = TN_MIN(clamped_output, 127);
+	return (q7_t) clamped_output;
+}
+
+/* mat_mult_kernel_s8_s16_reordered_fpreq with the residual added in the epilogue */
+static q7_t* mat_mult_kernel_s8_s16_reordered_fpreq_add(const q7_t *input_a,
+		const q15_t *input_b, const uint16_t output_ch, const float *scales,
+		const int32_t out_offset, const int16_t activation_min,
+		const int16_t activation_max, const uint16_t num_col_a,
+		const int32_t *const output_bias, const q7_t *res_0,
+		const float conv_scale, const float residual_scale,
+		const float residual_zero, const float output_scale,
+		const float output_zero, q7_t *out_0) {
+	/* set up the second output and residual pointers */
+	q7_t *out_1 = out_0 + output_ch;
+	const q7_t *res_1 = res_0 + output_ch;
+	const int32_t *bias = output_bias;
+
+	uint16_t row_count = output_ch / 2;
+	const q7_t *ip_a0 = input_a;
+	/* this loop over rows in A */
+	while (row_count) {
+		/* setup pointers for B */
+		const q15_t *ip_b0 = input_b;
+		const q15_t *ip_b1 = ip_b0 + num_col_a;
+
+		/* align the second pointer for A */
+		const q7_t *ip_a1 = ip_a0 + num_col_a;
+		const float scale_0 = scales[0];
+		const float scale_1 = scales[1];
+
+		/* Init accumulator with bias for channel N and N + 1 */
+		q31_t ch_0_out_0 = *bias;
+		q31_t ch_0_out_1 = *bias++;
+		q31_t ch_1_out_0 = *bias;
+		q31_t ch_1_out_1 = *bias++;
+
+		uint16_t col_count = num_col_a / 4;
+		/* accumulate over the vector */
+		while (col_count) {
+			q31_t a01, a02, a11, a12;
+			q31_t b0 = arm_nn_read_q15x2_ia(&ip_b0);
+			q31_t b1 = arm_nn_read_q15x2_ia(&ip_b1);
+
+			ip_a0 = read_and_pad_reordered(ip_a0, &a01, &a02);
+
+			ch_0_out_0 = __SMLAD(a01, b0, ch_0_out_0);
+			ip_a1 = read_and_pad_reordered(ip_a1, &a11, &a12);
+			ch_0_out_1 = __SMLAD(a01, b1, ch_0_out_1);
+			ch_1_out_0 = __SMLAD(a11, b0, ch_1_out_0);
+			b0 = arm_nn_read_q15x2_ia(&ip_b0);
+			ch_1_out_1 = __SMLAD(a11, b1, ch_1_out_1);
+
+			b1 = arm_nn_read_q15x2_ia(&ip_b1);
+
+			ch_0_out_0 = __SMLAD(a02, b0, ch_0_out_0);
+			ch_0_out_1 = __SMLAD(a02, b1, ch_0_out_1);
+			ch_1_out_0 = __SMLAD(a12, b0, ch_1_out_0);
+			ch_1_out_1 = __SMLAD(a12, b1, ch_1_out_1);
+
+			col_count--;
+		} /* while over col_count */
+
+		/* the residual of each element is read before the element is written, so the output can overwrite it */
+		*out_0++ = requantize_add(ch_0_out_0, scale_0, out_offset, activation_min,
+				activation_max, *res_0++, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+		*out_1++ = requantize_add(ch_0_out_1, scale_0, out_offset, activation_min,
+				activation_max, *res_1++, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+		*out_0++ = requantize_add(ch_1_out_0, scale_1, out_offset, activation_min,
+				activation_max, *res_0++, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+		*out_1++ = requantize_add(ch_1_out_1, scale_1, out_offset, activation_min,
+				activation_max, *res_1++, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+		scales += 2;
+
+		/* skip row */
+		ip_a0 += num_col_a;
+		row_count--;
+	}
+
+	if (output_ch & 1) {
+		/* setup pointers for B */
+		const q15_t *ip_b0 = input_b;
+		const q15_t *ip_b1 = ip_b0 + num_col_a;
+
+		/* Init accumulator with bias for channel N + 1 */
+		q31_t ch_0_out_0 = *bias;
+		q31_t ch_0_out_1 = ch_0_out_0;
+
+		int32_t col_count = num_col_a / 4;
+		while (col_count) {
+			q31_t a01, a02;
+			q31_t b0 = arm_nn_read_q15x2_ia(&ip_b0);
+			q31_t b1 = arm_nn_read_q15x2_ia(&ip_b1);
+
+			ip_a0 = read_and_pad_reordered(ip_a0, &a01, &a02);
+
+			ch_0_out_0 = __SMLAD(a01, b0, ch_0_out_0);
+			ch_0_out_1 = __SMLAD(a01, b1, ch_0_out_1);
+
+			b0 = arm_nn_read_q15x2_ia(&ip_b0);
+			b1 = arm_nn_read_q15x2_ia(&ip_b1);
+
+			ch_0_out_0 = __SMLAD(a02, b0, ch_0_out_0);
+			ch_0_out_1 = __SMLAD(a02, b1, ch_0_out_1);
+
+			col_count--;
+		} /* while over col_count */
+
+		*out_0++ = requantize_add(ch_0_out_0, *scales, out_offset, activation_min,
+				activation_max, *res_0, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+		*out_1++ = requantize_add(ch_0_out_1, *scales, out_offset, activation_min,
+				activation_max, *res_1, conv_scale, residual_scale,
+				residual_zero, output_scale, output_zero);
+	}
+
+	out_0 += output_ch;
+
+	/* return the new output pointer with offset */
+	return out_0;
+}
+
+tinyengine_status convolve_1x1_s8_fpreq_add(const q7_t *input,
+		const uint16_t input_x, const uint16_t input_y, const uint16_t input_ch,
+		const q7_t *kernel, const int32_t *bias, const float *scales,
+		const int32_t out_offset, const int32_t input_offset,
+		const int32_t out_activation_min, const int32_t out_activation_max,
+		const q7_t *residual, const float conv_scale, const float residual_scale,
+		const float residual_zero, const float output_scale, const float output_zero,
+		q7_t *output, const uint16_t output_x, const uint16_t output_y,
+		const uint16_t output_ch, q15_t *runtime_buf) {
+	if (input_ch % 4 != 0) {
+		return PARAM_NO_SUPPORT;
+	}
+
+	int32_t i_element;
+	(void) input_x;
+	(void) input_y;
+
+	/* Partial(two columns) im2col buffer */
+	q15_t *two_column_buffer = runtime_buf;
+	q7_t *out = output;
+	const q7_t *res = residual;
+	const int32_t num_elements = output_x * output_y;
+	const int channel_div4 = (input_ch >> 2);
+
+	const int16_t inoff16 = input_offset;
+	q31_t offset_q15x2 = __PKHBT(inoff16, inoff16, 16);
+
+	for (i_element = 0; i_element < num_elements / 2; i_element++) {
+		/* Fill buffer for partial im2col - two columns at a time */
+		q7_t *src = &input[i_element * input_ch * 2];
+		q15_t *dst = two_column_buffer;
+
+		//use variables
+		q31_t in_q7x4;
+		q31_t in_q15x2_1;
+		q31_t in_q15x2_2;
+		q31_t out_q15x2_1;
+		q31_t out_q15x2_2;
+
+		int cnt = channel_div4;	//two columns
+		while (cnt > 0) {
+			q7_q15_offset_reordered_ele(src, dst)
+			q7_q15_offset_reordered_ele(src, dst)
+			cnt--;
+		}
+
+		out = mat_mult_kernel_s8_s16_reordered_fpreq_add(kernel,
+				two_column_buffer, output_ch, scales, (q7_t) out_offset,
+				out_activation_min, out_activation_max,
+				input_ch * DIM_KER_Y * DIM_KER_X, bias, res, conv_scale,
+				residual_scale, residual_zero, output_scale, output_zero, out);
+		res += 2 * output_ch;
+	}
+
+	/* check if there is an odd column left-over for computation */
+	if (num_elements & 0x1) {
+		int32_t i_ch_out;
+		const q7_t *ker_a = kernel;
+		q7_t *src = &input[(num_elements - 1) * input_ch];
+		q15_t *dst = two_column_buffer;
+
+		//use variables
+		q31_t in_q7x4;
+		q31_t in_q15x2_1;
+		q31_t in_q15x2_2;
+		q31_t out_q15x2_1;
+		q31_t out_q15x2_2;
+
+		int cnt = channel_div4;	//two * numof2col columns
+		while (cnt > 0) {
+			q7_q15_offset_reordered_ele(src, dst)
+			cnt--;
+		}
+
+		for (i_ch_out = 0; i_ch_out < output_ch; i_ch_out++) {
+			q31_t sum = bias[i_ch_out];
+
+			/* Point to the beginning of the im2col buffer where the input is available as a rearranged column */
+			const q15_t *ip_as_col = runtime_buf;
+			uint16_t col_count = (input_ch * DIM_KER_X * DIM_KER_Y) >> 2;
+
+			while (col_count) {
+				q31_t ker_a1, ker_a2;
+				q31_t in_b1, in_b2;
+				ker_a = read_and_pad_reordered(ker_a, &ker_a1, &ker_a2);
+
+				in_b1 = arm_nn_read_q15x2_ia(&ip_as_col);
+				sum = __SMLAD(ker_a1, in_b1, sum);
+				in_b2 = arm_nn_read_q15x2_ia(&ip_as_col);
+				sum = __SMLAD(ker_a2, in_b2, sum);
+
+				col_count--;
+			}
+
+			*out++ = requantize_add(sum, scales[i_ch_out], out_offset,
+					out_activation_min, out_activation_max, *res++, conv_scale,
+					residual_scale, residual_zero, output_scale, output_zero);
+		}
+	}
+
+	/* Return to application */
+	return STATE_SUCCESS;
+}
@@ -0,0 +1,38 @@
+/* ----------------------------------------------------------------------
+ * Project: TinyEngine
+ * Title:   concat_slice.c
+ *
+ * Reference papers:
+ *  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+ *  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+ *  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+ * Contact authors:
+ *  - Wei-Ming Chen, wmchen@mit.edu
+ *  - Wei-Chen Wang, wweichen@mit.edu
+ *  - Ji Lin, jilin@mit.edu
+ *  - Ligeng Zhu, ligeng@mit.edu
+ *  - Song Han, songhan@mit.edu
+ *
+ * Target ISA:  ARMv7E-M
+ * -------------------------------------------------------------------- */
+
+#include "arm_nnfunctions.h"
+#include "tinyengine_function.h"
+
+
+/* Copy one input of a concatenation into its slice of the output. The input
+ * is split into "outer" rows of input_size bytes, i.e., the dimensions before
+ * the concatenated axis, and each row is placed at a stride of output_size
+ * bytes. "output" points to the slice of the first row. */
+tinyengine_status concat_slice(const q7_t *input, const int outer,
+	const int input_size, q7_t *output, const int output_size) {
+
+	int rows = outer;
+
+	while(rows--){
+		memcpy(output, input, input_size);
+		input += input_size; output += output_size;
+	}
+
+	return STATE_SUCCESS;
+}
@@ -0,0 +1,51 @@
+/* ----------------------------------------------------------------------
+ * Project: TinyEngine
+ * Title:   pad_hw.c
+ *
+ * Reference papers:
+ *  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+ *  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+ *  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+ * Contact authors:
+ *  - Wei-Ming Chen, wmchen@mit.edu
+ *  - Wei-Chen Wang, wweichen@mit.edu
+ *  - Ji Lin, jilin@mit.edu
+ *  - Ligeng Zhu, ligeng@mit.edu
+ *  - Song Han, songhan@mit.edu
+ *
+ * Target ISA:  ARMv7E-M
+ * -------------------------------------------------------------------- */
+
+#include "arm_nnfunctions.h"
+#include "tinyengine_function.h"
+
+/* Pad the height and width of an HWC tensor with pad_value, i.e., the input
+ * zero point, as the PAD op of TFLite. */
+tinyengine_status pad_hw(const q7_t *input, const uint16_t input_h,
+	const uint16_t input_w, const uint16_t input_ch, const uint16_t pad_t,
+	const uint16_t pad_b, const uint16_t pad_l, const uint16_t pad_r,
+	const q7_t pad_value, q7_t *output) {
+
+	const int row_size = input_w * input_ch;
+	const int output_row_size = (pad_l + input_w + pad_r) * input_ch;
+
+	//top rows
+	memset(output, pad_value, pad_t * output_row_size);
+	output += pad_t * output_row_size;
+
+	int rows = input_h;
+
+	while(rows--){
+		memset(output, pad_value, pad_l * input_ch);
+		output += pad_l * input_ch;
+		memcpy(output, input, row_size);
+		input += row_size; output += row_size;
+		memset(output, pad_value, pad_r * input_ch);
+		output += pad_r * input_ch;
+	}
+
+	//bottom rows
+	memset(output, pad_value, pad_b * output_row_size);
+
+	return STATE_SUCCESS;
+}
@@ -18,7 +18,11 @@
 
 import os
 
+import numpy as np
+
+from .ConstantPool import ConstantPool, fuseDepthwiseBias, storedTable
 from .OpGenerator import OpGenerator
+from .PatchBasedUtil import FEAT_STRIDE
 
 Codegen_root = "./codegen/"
 include_path = Codegen_root + "Include/"
@@ -28,6 +32,14 @@ use_hard_switsh = False
 gen_kernels = True
 use_aggressive_unroll = True
 
+# binary weight mode: all read-only tables are packed into one blob instead of C initializers
+weight_blob_name = "genWeights"
+weight_blob_symbol = "weight_blob"
+weight_blob_alignment = 4
+
+# activation buffer shared by several models, see genSharedArena
+arena_symbol = "tinyengine_arena"
+
 
 class CodeGenerator:
     """Provide utilities to generate C code for a given model and memory schdeule."""
@@ -50,8 +62,22 @@ class CodeGenerator:
         dummy_address=False,
         outputTables=None,
         detectionUtils=None,
+        binary_weights=False,
+        dedup_constants=True,
+        model_name=None,
+        shared_arena=False,
     ):
         self.MemSche = memsche
+        # with a model name, the files are named genModel_<name>.h/.c, the entry points <function>_<name>, and all
+        # tables and variables are file-local, so that the files of several models can be linked together
+        self.model_name = model_name
+        suffix = "" if model_name is None else f"_{model_name}"
+        self.header_name = f"genModel{suffix}.h"
+        self.weight_blob_name = weight_blob_name + suffix
+        self.weight_blob_symbol = weight_blob_symbol + suffix
+        self.storage = "" if model_name is None else "static "
+        # place the activations in the arena shared by all models instead of a buffer of this model
+        self.shared_arena = shared_arena
 
         # Check if path exists, create it if not
         if not os.path.exists(include_path):
@@ -59,8 +85,8 @@ class CodeGenerator:
         if not os.path.exists(source_path):
             os.makedirs(source_path)
 
-        self.header_handle = open(include_path + "genModel.h", "w")
-        self.source_handle = open(source_path + "genModel.c", "w")
+        self.header_handle = open(include_path + self.header_name, "w")
+        self.source_handle = open(source_path + f"genModel{suffix}.c", "w")
         self.inplace = inplace
         self.BIT = precision
         self.unsigned_input = unsigned_input
@@ -73,6 +99,10 @@ class CodeGenerator:
         self.trainSRAMTable = []
         self.outputTables = outputTables
         self.detectionUtils = detectionUtils
+        self.binary_weights = binary_weights
+        self.weight_blob = bytearray()
+        self.dedup_constants = dedup_constants
+        self.constant_pool = ConstantPool()
 
     def _readOnly(self, name):
         if self.outputTables is None or name is None:
@@ -89,6 +119,7 @@ class CodeGenerator:
 
         # parse trainable parameters & assign the corresponding buffers for layers
         self._parseTrainable()
+        self._genWeightBlob()
 
         # include all headers
         self._includeHeaders()
@@ -109,10 +140,18 @@ class CodeGenerator:
             op_gen = OpGenerator(include_path, source_path, self.MemSche.layer, self.fp_requantize)
             op_gen.genOpcode()
 
+    def _symbol(self, name):
+        # name of a function exported by the generated files
+        return name if self.model_name is None else f"{name}_{self.model_name}"
+
     def _genDetprocessing(self):
         if self.detectionUtils is not None:
             fp = self.source_handle
-            fp.write(self.detectionUtils.genPostProcessing())
+            string = self.detectionUtils.genPostProcessing()
+            if self.model_name is not None:
+                string = string.replace("const int anchors", "static const int anchors")
+                string = string.replace("void det_post_procesing(", f"void {self._symbol('det_post_procesing')}(")
+            fp.write(string)
 
     def _genOpstr(self, op, *args):
         if self.profile_mode:
@@ -138,13 +177,15 @@ class CodeGenerator:
                 "n_patch"
             ]
             # by default, we go three stride 2 conv in the patch-based inference
-            patch_out_w = int((first_width - self.patch_params["pad_l"]) / 8)
+            patch_out_w = int((first_width - self.patch_params["pad_l"]) / FEAT_STRIDE)
             # by default, we go three stride 2 conv in the patch-based inference
-            patch_out_h = int((first_height - self.patch_params["pad_l"]) / 8)
+            patch_out_h = int((first_height - self.patch_params["pad_l"]) / FEAT_STRIDE)
             out_w = self.patch_params["output_w"]
             # generate code for testing whole inference time
             string += (
-                """void end2endinference(q7_t* img){
+                "void "
+                + self._symbol("end2endinference")
+                + """(q7_t* img){
     //stage 1
     int i, j, h, w, c;
     for (i = 0; i < """
@@ -216,7 +257,9 @@ class CodeGenerator:
                 //skip right
                 patch_input += pad_r * 3;
             }
-            invoke_1patch(pad_t,pad_b,pad_l,pad_r);
+            """
+                + self._symbol("invoke_1patch")
+                + """(pad_t,pad_b,pad_l,pad_r);
             /* concat the output from buffer0 (this is set manually for now) */
             q7_t* output_ptr = buffer1 + (i * """
                 + str(patch_out_w)
@@ -251,12 +294,14 @@ class CodeGenerator:
         }
     }
     //stage 2
-    invoke();
+    """
+                + self._symbol("invoke")
+                + """(NULL);
 }"""
             )
-            string += """
+            string += f"""
 
-void invoke_1patch(uint16_t pad_t, uint16_t pad_b, uint16_t pad_l ,uint16_t pad_r){
+void {self._symbol("invoke_1patch")}(uint16_t pad_t, uint16_t pad_b, uint16_t pad_l ,uint16_t pad_r){{
 """
             fp.write(string)
 
@@ -308,16 +353,16 @@ void invoke_1patch(uint16_t pad_t, uint16_t pad_b, uint16_t pad_l ,uint16_t pad_
 
             fp.write(string)
         else:  # not patch-based
-            string = """void end2endinference(q7_t* img){
-    invoke(NULL);
-}
+            string = f"""void {self._symbol("end2endinference")}(q7_t* img){{
+    {self._symbol("invoke")}(NULL);
+}}
 """
             fp = self.source_handle
             fp.write(string)
 
     def _genInvoke(self):
         fp = self.source_handle
-        string = "void invoke(float* labels){\n"
+        string = f"void {self._symbol('invoke')}(float* labels){{\n"
         fp.write(string)
 
         schedule = self.MemSche
@@ -377,34 +422,44 @@ void invoke_1patch(uint16_t pad_t, uint16_t pad_b, uint16_t pad_l ,uint16_t pad_
         string = "\n/* sram:" + str(schedule.peakmem) + ", flash:" + str(schedule.flash) + " */\n"
         fp.write(string + "\n")
 
-        string = "static signed char buffer[" + str(schedule.peakmem) + "];\n"
+        if self.shared_arena:
+            buffer = arena_symbol
+            string = f"extern signed char {arena_symbol}[];\n"
+        else:
+            buffer = "buffer"
+            string = "static signed char buffer[" + str(schedule.peakmem) + "];\n"
         fp.write(string)
         accumulate_ptr = 0
-        string = "static signed char *buffer0 = &buffer[" + str(accumulate_ptr) + "];\n"
+        string = f"static signed char *buffer0 = &{buffer}[" + str(accumulate_ptr) + "];\n"
         accumulate_ptr += int(schedule.buffers["input_output"])
         fp.write(string)
-        string = "static signed char *buffer1 = &buffer[" + str(accumulate_ptr) + "];\n"
+        string = f"static signed char *buffer1 = &{buffer}[" + str(accumulate_ptr) + "];\n"
         accumulate_ptr += int(schedule.buffers["residual"])
         fp.write(string)
 
-        string = "static int16_t *sbuf = (int16_t *)&buffer[" + str(accumulate_ptr) + "];\n"
-        accumulate_ptr += int(schedule.buffers["im2col"])
-        fp.write(string)
-        string = "static int32_t *kbuf = (int32_t *)&buffer[" + str(accumulate_ptr) + "];\n"
-        accumulate_ptr += int(schedule.buffers["kernel"])
-        fp.write(string)
-        string = "const int SBuffer_size = " + str(int(schedule.buffers["im2col"])) + ";\n"
-        fp.write(string)
-        string = "const int KBuffer_size = " + str(int(schedule.buffers["kernel"])) + ";\n"
-        fp.write(string + "\n")
+        # the scratch buffers shared by all layers, unless each layer has its own placed with the activations
+        if any(
+            "sbuf_buf_add_offset" not in op.params or "kbuf_buf_add_offset" not in op.params for op in schedule.layer
+        ):
+            string = f"static int16_t *sbuf = (int16_t *)&{buffer}[" + str(accumulate_ptr) + "];\n"
+            accumulate_ptr += int(schedule.buffers["im2col"])
+            fp.write(string)
+            string = f"static int32_t *kbuf = (int32_t *)&{buffer}[" + str(accumulate_ptr) + "];\n"
+            accumulate_ptr += int(schedule.buffers["kernel"])
+            fp.write(string)
+            string = self.storage + "const int SBuffer_size = " + str(int(schedule.buffers["im2col"])) + ";\n"
+            fp.write(string)
+            string = self.storage + "const int KBuffer_size = " + str(int(schedule.buffers["kernel"])) + ";\n"
+            fp.write(string)
+        fp.write("\n")
 
     def _includeHeaders(self):
-        include_string = """/* Automatically generated source file */
+        include_string = f"""/* Automatically generated source file */
 #include <float.h>
 #include "arm_nnfunctions.h"
 
 #include "genNN.h"
-#include "genModel.h"
+#include "{self.header_name}"
 
 #include "tinyengine_function.h"
 //#include "tinyengine_function_fp.h"
@@ -413,26 +468,32 @@ void invoke_1patch(uint16_t pad_t, uint16_t pad_b, uint16_t pad_l ,uint16_t pad_
         if self.profile_mode:
             include_string += '#include "profile.h"\n'
 
-        include_string += """
+        include_string += f"""
 /* Variables used by all ops */
-ADD_params add_params;
+{self.storage}ADD_params add_params;
 //Conv_Params conv_params;
 //Depthwise_Params dpconv_params;
-int i;
-int8_t *int8ptr;
-float *fptr,*fptr2,*fptr3;
-
-signed char* getInput() {
-    return &buffer0[""" + f"{self.MemSche.layer[0].params['input_buf_add_offset']}" + """];
-}
-signed char* getOutput() {
+{self.storage}int i;
+{self.storage}int8_t *int8ptr;
+{self.storage}float *fptr,*fptr2,*fptr3;
+
+signed char* {self._symbol("getInput")}() {{
+    return &buffer0[{self.MemSche.layer[0].params['input_buf_add_offset']}];
+}}
+signed char* {self._symbol("getOutput")}() {{
     return NNoutput;
-}\n"""
+}}\n"""
         fp = self.source_handle
         fp.write(include_string)
 
     def _parseTrainable(self):
         schedule = self.MemSche
+        if self.binary_weights:
+            self.header_handle.write(
+                f"/* read-only tables are stored in {self.weight_blob_name}.bin, "
+                + f"linked as {self.weight_blob_symbol} */\n"
+                + f"extern const unsigned char {self.weight_blob_symbol}[];\n"
+            )
         for i, op in enumerate(schedule.layer):
             layer_info = op.get_layer_info()
             if layer_info["op"] == "CONV_2D":
@@ -462,33 +523,24 @@ signed char* getOutput() {
                 layer_info["parsed_trainable"] = self.parse_count
                 self.parse_count += 1
             elif layer_info["op"] == "DEPTHWISE_CONV_2D":
+                # one view of the HWC weights shared by the weight and bias parsers, no copies
+                weight = layer_info["weight_value"].reshape(-1)
                 if layer_info["kernel_h"] > layer_info["kernel_w"]:
                     self._parseCWHWeight(
                         self.parse_count,
-                        layer_info["weight_value"].flatten(),
+                        weight,
                         layer_info["kernel_h"],
                         layer_info["kernel_w"],
                         layer_info["input_c"],
                     )
                 else:
-                    if "weight_name" in layer_info:
-                        self._parseCHWWeight(
-                            self.parse_count,
-                            layer_info["weight_value"].flatten(),
-                            layer_info["input_c"],
-                        )
-                    else:
-                        self._parseCHWWeight(
-                            self.parse_count,
-                            layer_info["weight_value"].flatten(),
-                            layer_info["input_c"],
-                        )
+                    self._parseCHWWeight(self.parse_count, weight, layer_info["input_c"])
                     if "bias_name" in layer_info:
                         self._parseoffsetBias(
                             self.parse_count,
                             layer_info["bias"].flatten(),
                             layer_info["input_zero_point"] * -1,
-                            layer_info["weight_value"].flatten(),
+                            weight,
                             layer_info["input_c"],
                             layer_info["bias_name"],
                             self._readOnly(layer_info["bias_name"]),
@@ -498,7 +550,7 @@ signed char* getOutput() {
                             self.parse_count,
                             layer_info["bias"].flatten(),
                             layer_info["input_zero_point"] * -1,
-                            layer_info["weight_value"].flatten(),
+                            weight,
                             layer_info["input_c"],
                         )
                     self._parseEffectivescales(self.parse_count, layer_info["effective_scale"].flatten())
@@ -527,60 +579,31 @@ signed char* getOutput() {
                 pass
 
     def _parseCWHWeight(self, Lindex, weight, height, width, channel):
-        fp = self.header_handle
         # 8bit implementation
         if self.BIT == 8:
-            string = "const unsigned char CWHweight" + str(Lindex) + "[" + str(len(weight)) + "] = {"
-            fp.write(string)
-            for j in range(channel):
-                for w in range(width):
-                    for h in range(height):
-                        value = weight[(h * width + w) * channel + j]
-                        if value < 0:
-                            value += 256
-                        fp.write(str(format(value, "#04x")) + ", ")
+            # HWC -> CWH
+            self._writeConstTable(
+                "unsigned char", "CWHweight" + str(Lindex), weight.reshape(height, width, channel).transpose(2, 1, 0)
+            )
         else:
             raise NotImplementedError
 
-        fp.write("};\n")
-
     def _parseCHWWeight(self, Lindex, weight, channel):
-        fp = self.header_handle
         kernelsize = int(len(weight) / channel)
         # 8bit implementation
         if self.BIT == 8:
-            string = "const unsigned char CHWweight" + str(Lindex) + "[" + str(len(weight)) + "] = {"
-            fp.write(string)
-            for j in range(channel):
-                for i in range(kernelsize):
-                    value = int(weight[i * channel + j])
-                    if value < 0:
-                        value += 256
-                    fp.write(str(format(value, "#04x")) + ", ")
+            # HWC -> CHW
+            self._writeConstTable("unsigned char", "CHWweight" + str(Lindex), weight.reshape(kernelsize, channel).T)
         else:
             raise NotImplementedError
 
-        fp.write("};\n")
-
     def _parseEffectivescales(self, Lindex, scales):
-        fp = self.header_handle
-        string = "const float scales" + str(Lindex) + "[" + str(len(scales)) + "] = {"
-        fp.write(string)
-        for _, value in enumerate(scales):
-            fp.write(str(value) + ", ")
-        fp.write("};\n")
+        self._writeConstTable("float", "scales" + str(Lindex), scales)
 
     def _parseWeight(self, Lindex, weight, weight_name=None, is_const=True):
         fp = self.header_handle
-        const_str = "const " if is_const else ""
-        string = f"{const_str}unsigned char weight" + str(Lindex) + "[" + str(len(weight)) + "] = {"
-        fp.write(string)
-        for _, value in enumerate(weight):
-            value = int(value)
-            if value < 0:
-                value += 256
-            fp.write(str(format(value, "#04x")) + ", ")
-        fp.write("};\n")
+        const_str = self.storage + ("const " if is_const else "")
+        self._writeConstTable("unsigned char", "weight" + str(Lindex), weight, is_const)
 
         if weight_name is not None:
             for r in self.trainSRAMTable:
@@ -595,51 +618,62 @@ signed char* getOutput() {
             fp.write(string)
 
     def _parseoffsetBias(self, Lindex, bias, input_offset, weight, channel, bias_name=None, is_const=True):
-        fp = self.header_handle
-        const_str = "const " if is_const else ""
-        string = f"{const_str}int32_t offsetBias" + str(Lindex) + "[" + str(len(bias)) + "] = {"
-        fp.write(string)
-        kernelsize = int(len(weight) / channel)
         # fuse the offset into bias
-        for i in range(channel):
-            tmpW = 0
-            for j in range(kernelsize):
-                tmpW += weight[j * channel + i]
-            fp.write(str(self.int32_clip(bias[i] + tmpW * input_offset)) + ", ")
-        fp.write("};\n")
-        string = f"{const_str}int32_t offsetRBias" + str(Lindex) + "[" + str(len(bias)) + "] = {"
-        fp.write(string)
-        kernelsize = int(len(weight) / channel)
-        for i in range(channel):
-            tmpW = 0
-            for j in range(kernelsize):
-                tmpW += weight[j * channel + i]
-            fp.write(str(bias[i] + tmpW * input_offset - self.int32_clip(bias[i] + tmpW * input_offset)) + ", ")
-        fp.write("};\n")
+        clipped_bias, remainder = fuseDepthwiseBias(bias, input_offset, weight, channel)
+
+        self._writeConstTable("int32_t", "offsetBias" + str(Lindex), clipped_bias, is_const)
+        # the remainder that does not fit into int32
+        self._writeConstTable("int32_t", "offsetRBias" + str(Lindex), remainder, is_const)
 
     def _parseBias(self, Lindex, bias, bias_name=None, is_const=True):
-        fp = self.header_handle
-        const_str = "const " if is_const else ""
-        string = f"{const_str}int32_t bias" + str(Lindex) + "[" + str(len(bias)) + "] = {"
-        fp.write(string)
-        for _, value in enumerate(bias):
-            value = int(value)
-            fp.write(str(value) + ", ")
-        fp.write("};\n")
+        self._writeConstTable("int32_t", "bias" + str(Lindex), bias.astype(np.int64), is_const)
 
     def _parseRequantize(self, Lindex, shift, multiplier):
-        fp = self.header_handle
-        string = "const int32_t shift" + str(Lindex) + "[" + str(len(shift)) + "] = {"
-        fp.write(string)
-        for _, value in enumerate(shift):
-            fp.write(str(value) + ", ")
-        fp.write("};\n")
+        self._writeConstTable("int32_t", "shift" + str(Lindex), shift)
+        self._writeConstTable("int32_t", "multiplier" + str(Lindex), multiplier)
 
-        string = "const int32_t multiplier" + str(Lindex) + "[" + str(len(multiplier)) + "] = {"
-        fp.write(string)
-        for _, value in enumerate(multiplier):
-            fp.write(str(value) + ", ")
-        fp.write("};\n")
+    def _writeConstTable(self, ctype, name, values, is_const=True):
+        """Write a table as a C initializer or into the weight blob, or alias an identical read-only table."""
+        fp = self.header_handle
+        values = np.asarray(values)
+        if self.dedup_constants and is_const:
+            # compare what ends up in flash, the scheduler counts the flash of the tables in the same way
+            first_name = self.constant_pool.addTable(name, ctype, storedTable(ctype, values))
+            if first_name is not None:
+                fp.write(f"#define {name} {first_name}\n")
+                return
+        if self.binary_weights and is_const:
+            # align every table so that int32/float tables can be read directly from the blob
+            self.weight_blob += bytes(-len(self.weight_blob) % weight_blob_alignment)
+            offset = len(self.weight_blob)
+            self.weight_blob += storedTable(ctype, values).tobytes()
+            fp.write(f"#define {name} ((const {ctype} *)&{self.weight_blob_symbol}[{offset}])\n")
+        else:
+            const_str = self.storage + ("const " if is_const else "")
+            string = f"{const_str}{ctype} {name}[{values.size}] = {{"
+            if ctype == "unsigned char":
+                string += _hexTableStr(values)
+            else:
+                string += _decTableStr(values)
+            fp.write(string + "};\n")
+
+    def _genWeightBlob(self):
+        if not self.binary_weights:
+            return
+        with open(source_path + self.weight_blob_name + ".bin", "wb") as f:
+            f.write(self.weight_blob)
+        # assembly stub to link the blob, e.g., objcopy -I binary can be used instead
+        with open(source_path + self.weight_blob_name + ".s", "w") as f:
+            f.write(
+                f"""/* Automatically generated source file */
+    .section .rodata.{self.weight_blob_symbol},"a",%progbits
+    .balign 16
+    .global {self.weight_blob_symbol}
+{self.weight_blob_symbol}:
+    .incbin "{self.weight_blob_name}.bin"
+    .size {self.weight_blob_symbol}, {len(self.weight_blob)}
+"""
+            )
 
     def int32_clip(self, a):
         if a < -(2**31):
@@ -653,6 +687,57 @@ signed char* getOutput() {
         self.source_handle.close()
 
 
+def genSharedArena(memory_schedulers, fp_requantize=False):
+    """Generate the arena shared by several models, after the code of each one is generated with shared_arena set.
+
+    memory_schedulers maps the name of each model to its memory schedule. The models never run at the same time, so
+    the arena is as large as the largest peak memory of them. Returns the size of the arena in bytes.
+    """
+    arena_size = max(int(schedule.peakmem) for schedule in memory_schedulers.values())
+    with open(include_path + "genArena.h", "w") as fp:
+        fp.write("/* Automatically generated source file */\n#ifndef GENARENA_H_\n#define GENARENA_H_\n\n")
+        fp.write(f"#define ARENA_SIZE {arena_size}\n\n")
+        for name in memory_schedulers:
+            fp.write(
+                f"/* {name}: sram {memory_schedulers[name].peakmem} */\n"
+                + f"signed char* getInput_{name}();\n"
+                + f"signed char* getOutput_{name}();\n"
+                + f"void invoke_{name}(float* labels);\n"
+                + f"void end2endinference_{name}(signed char* img);\n\n"
+            )
+        fp.write("#endif /* GENARENA_H_ */\n")
+    with open(source_path + "genArena.c", "w") as fp:
+        fp.write(
+            '/* Automatically generated source file */\n#include "genArena.h"\n\n'
+            + f"signed char {arena_symbol}[ARENA_SIZE];\n"
+        )
+
+    # the kernels and their declarations in genInclude.h cover the layers of all models
+    if gen_kernels:
+        layers = [op for schedule in memory_schedulers.values() for op in schedule.layer]
+        OpGenerator(include_path, source_path, layers, fp_requantize).genOpcode()
+    return arena_size
+
+
+# "0x00, ", "0x01, ", ..., "0xff, " as a (256, 6) byte table, indexed by the unsigned byte value
+_HEX_TABLE = np.frombuffer(
+    "".join(format(value, "#04x") + ", " for value in range(256)).encode("ascii"), dtype=np.uint8
+).reshape(256, 6)
+
+
+def _hexTableStr(values):
+    # int8 -> uint8 is a view, so negative values wrap to value + 256 without a copy
+    unsigned = np.asarray(values).astype(np.int8, copy=False).view(np.uint8)
+    return _HEX_TABLE[unsigned].tobytes().decode("ascii")
+
+
+def _decTableStr(values):
+    values = np.asarray(values).ravel()
+    if values.size == 0:
+        return ""
+    return ", ".join(values.astype(str)) + ", "
+
+
 def _findtheinferenceOutput(layers):
     for cnt, op in enumerate(layers):
         if op.params["output_dtype"] != "int8":
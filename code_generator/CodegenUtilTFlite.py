@@ -16,29 +16,56 @@
 # Target ISA:  ARMv7E-M
 # ----------------------------------------------------------------------
 
-import os
-from tempfile import TemporaryDirectory
-
-from .CodeGenerator import CodeGenerator
+from .allocator.base_allocator import dumpPlacement
+from .CodeGenerator import Codegen_root, CodeGenerator, genSharedArena, use_aggressive_unroll
+from .CompileCache import CompileCache, fileDigest, listFiles
 from .GeneralMemoryScheduler import GeneralMemoryScheduler
+from .InputResizer import InputResizer
+from .LayerFusion import fuseConvAdd
 from .TfliteConvertor import TfliteConvertor
 
 
 def GenerateSourceFilesFromTFlite(
     tflite_path,
     life_cycle_path=None,
+    binary_weights=False,
+    input_resolution=None,
+    cache_dir=None,
 ):
+    """Generate the source files of the model into ./codegen and return the peak activation memory in bytes.
+
+    input_resolution: (h, w) to resize the input of the model to, None to keep it.
+    cache_dir: directory of a CompileCache to reuse the results of the stages that have not changed, None to disable.
+    """
     use_inplace = True
 
-    with TemporaryDirectory() as WORKING_DIR:
-        if life_cycle_path is None:
-            schedule_image_path = os.path.join(WORKING_DIR, "schedule.png")
-        else:
-            schedule_image_path = life_cycle_path
+    cache = None
+    if cache_dir is not None:
+        cache = CompileCache(cache_dir)
+        model_digest = fileDigest(tflite_path)
+        ir_key = cache.key(model_digest, input_resolution)
+        schedule_key = cache.key(ir_key, use_inplace)
+        files_key = cache.key(schedule_key, binary_weights)
+        result = cache.load("result", files_key)
+        if result is not None and cache.loadFiles(files_key, Codegen_root):
+            print("Use cached source files.")
+            if life_cycle_path is not None:
+                dumpPlacement(result["placement"], life_cycle_path)
+            return result["peak"]
 
-        tf_convertor = TfliteConvertor(tflite_path)
-        tf_convertor.parseOperatorInfo()
-        layer = tf_convertor.layer
+    memory_scheduler = cache.load("schedule", schedule_key) if cache is not None else None
+    if memory_scheduler is None:
+        layer = cache.load("ir", ir_key) if cache is not None else None
+        if layer is None:
+            tf_convertor = TfliteConvertor(tflite_path)
+            tf_convertor.parseOperatorInfo()
+            layer = tf_convertor.layer
+            if input_resolution is not None:
+                InputResizer(layer).inputResize(*input_resolution)
+            # the code is generated with fp_requantize, which has the fused conv + add kernel
+            fuseConvAdd(layer, use_aggressive_unroll)
+            if cache is not None:
+                cache.store("ir", ir_key, layer)
         outTable = []
         VisaulizeTrainable = False  # disable for code gen
         memory_scheduler = GeneralMemoryScheduler(
@@ -47,13 +74,70 @@ def GenerateSourceFilesFromTFlite(
             False,
             outputTables=outTable,
             inplace=use_inplace,
-            mem_visual_path=schedule_image_path,
+            mem_visual_path=life_cycle_path,
             VisaulizeTrainable=VisaulizeTrainable,
         )
         memory_scheduler.USE_INPLACE = use_inplace
         memory_scheduler.allocateMemory()
+        if cache is not None:
+            cache.store("schedule", schedule_key, memory_scheduler)
+    elif life_cycle_path is not None:
+        memory_scheduler.allocator.visualize(life_cycle_path)
+
+    # the parser does not produce output tables for tflite models
+    outTable = []
+    files_before = listFiles(Codegen_root)
+    code_generator = CodeGenerator(
+        memsche=memory_scheduler,
+        inplace=memory_scheduler.USE_INPLACE,
+        unsigned_input=False,
+        patch_params=None,
+        FP_output=False,
+        profile_mode=False,
+        fp_requantize=True,
+        tflite_op=False,
+        dummy_address=False,
+        outputTables=outTable,
+        binary_weights=binary_weights,
+    )
+    # set detection outputs before codegen if any
+    code_generator.codeGeneration()
+
+    peak = memory_scheduler.buffers["input_output"]
+    if cache is not None:
+        # only the files written by this run belong to the model
+        files = [name for name, mtime in listFiles(Codegen_root).items() if files_before.get(name) != mtime]
+        cache.storeFiles(files_key, Codegen_root, files)
+        cache.store("result", files_key, {"peak": peak, "placement": memory_scheduler.allocator.export()})
+    return peak
 
-        outTable = tf_convertor.outputTables if hasattr(tf_convertor, "outputTables") else []
+
+def GenerateSourceFilesFromTFliteModels(tflite_paths, binary_weights=False):
+    """Generate the source files of several models sharing one activation arena and return its size in bytes.
+
+    tflite_paths maps the name of each model to its tflite file. The models must never run at the same time, each one
+    gets genModel_<name>.h/.c with the entry points invoke_<name>() etc. declared in genArena.h.
+    """
+    use_inplace = True
+
+    memory_schedulers = {}
+    for name, tflite_path in tflite_paths.items():
+        tf_convertor = TfliteConvertor(tflite_path)
+        tf_convertor.parseOperatorInfo()
+        fuseConvAdd(tf_convertor.layer, use_aggressive_unroll)
+        memory_scheduler = GeneralMemoryScheduler(
+            tf_convertor.layer,
+            False,
+            False,
+            outputTables=[],
+            inplace=use_inplace,
+            VisaulizeTrainable=False,
+        )
+        memory_scheduler.USE_INPLACE = use_inplace
+        memory_scheduler.allocateMemory()
+        memory_schedulers[name] = memory_scheduler
+
+    for name, memory_scheduler in memory_schedulers.items():
         code_generator = CodeGenerator(
             memsche=memory_scheduler,
             inplace=memory_scheduler.USE_INPLACE,
@@ -64,9 +148,11 @@ def GenerateSourceFilesFromTFlite(
             fp_requantize=True,
             tflite_op=False,
             dummy_address=False,
-            outputTables=outTable,
+            outputTables=[],
+            binary_weights=binary_weights,
+            model_name=name,
+            shared_arena=True,
         )
-        # set detection outputs before codegen if any
         code_generator.codeGeneration()
 
-        return memory_scheduler.buffers["input_output"]
+    return genSharedArena(memory_schedulers, fp_requantize=True)
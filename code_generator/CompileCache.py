@@ -0,0 +1,118 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   CompileCache.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+
+import hashlib
+import os
+import pickle
+import shutil
+
+__all__ = ["CompileCache", "fileDigest", "generatorVersion", "listFiles"]
+
+_generator_version = None
+
+
+class CompileCache:
+    """On-disk cache of the compilation stages, so that unchanged stages are not run again for the same model.
+
+    Each entry is keyed by the digests of its inputs (e.g., the tflite content and the options of the stage) and the
+    version of the generator. Stage results are pickled, the emitted source files are stored as copies.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, *parts):
+        h = hashlib.sha1(generatorVersion().encode())
+        for p in parts:
+            h.update(repr(p).encode())
+            h.update(b"|")
+        return h.hexdigest()
+
+    def load(self, stage, key):
+        """Return the cached result of the stage, None if not found."""
+        path = self._path(stage, key) + ".pkl"
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def store(self, stage, key, result):
+        path = self._path(stage, key) + ".pkl"
+        # write to a temporary file first so that concurrent builds never read a partial entry
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def loadFiles(self, key, out_dir):
+        """Copy the cached files into out_dir, return False if not found."""
+        path = self._path("files", key)
+        if not os.path.isdir(path):
+            return False
+        shutil.copytree(path, out_dir, dirs_exist_ok=True)
+        return True
+
+    def storeFiles(self, key, out_dir, files):
+        """Store the given files, relative to out_dir."""
+        path = self._path("files", key)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        for name in files:
+            os.makedirs(os.path.dirname(os.path.join(tmp_path, name)), exist_ok=True)
+            shutil.copy2(os.path.join(out_dir, name), os.path.join(tmp_path, name))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    def _path(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key}")
+
+
+def listFiles(out_dir):
+    """Return the modification time of each file under out_dir, by path relative to out_dir."""
+    files = {}
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, out_dir)] = os.stat(path).st_mtime_ns
+    return files
+
+
+def fileDigest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def generatorVersion():
+    """Return a digest of the sources of the code generator, so that cache entries of other versions are not used."""
+    global _generator_version
+    if _generator_version is None:
+        root = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.sha1()
+        for dirpath, dirnames, names in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+            for name in sorted(names):
+                if name.endswith(".py"):
+                    path = os.path.join(dirpath, name)
+                    h.update(os.path.relpath(path, root).encode())
+                    h.update(fileDigest(path).encode())
+        _generator_version = h.hexdigest()
+    return _generator_version
@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   ConstantPool.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import hashlib
+
+import numpy as np
+
+# data type of each C table type in flash, little-endian as read by the MCU, e.g., from the weight blob
+TABLE_DTYPE = {"unsigned char": "<i1", "int32_t": "<i4", "float": "<f4"}
+
+
+class ConstantPool:
+    """Track constant tables by content so that identical tables are stored in flash only once."""
+
+    def __init__(self):
+        # content digest -> name of the first table with this content
+        self.tables = {}
+        self.saved_bytes = 0
+
+    def add(self, name, size, *contents):
+        """Register a table of size bytes, return the name of an identical earlier table or None."""
+        digest = _contentDigest(contents)
+        if digest in self.tables:
+            self.saved_bytes += int(size)
+            return self.tables[digest]
+        self.tables[digest] = name
+        return None
+
+    def addTable(self, name, ctype, stored):
+        """Register a C table in its stored form (see storedTable), return the name of an identical earlier table."""
+        return self.add(name, stored.nbytes, ctype, stored.ravel())
+
+
+def storedTable(ctype, values):
+    """The values of a C table as stored in flash, e.g., float tables are stored as 32-bit floats."""
+    return np.asarray(values).astype(TABLE_DTYPE[ctype])
+
+
+def fuseDepthwiseBias(bias, input_offset, weight, channel):
+    """Fuse the input offset into the bias of depthwise conv, return the int32 bias and the remainder not fitting."""
+    # accumulated in int64 so that the kernel sum cannot overflow
+    kernel_sum = weight.reshape(-1, channel).sum(axis=0, dtype=np.int64)
+    fused_bias = bias.astype(np.int64) + kernel_sum * np.int64(input_offset)
+    clipped_bias = np.clip(fused_bias, -(2**31), 2**31 - 1)
+    return clipped_bias, fused_bias - clipped_bias
+
+
+def layerTables(params):
+    """The constant tables CodeGenerator writes for a layer, as (weight/bias/scale, name, C type, values)."""
+    op = params["op"]
+    if op == "FULLY_CONNECTED":
+        return [
+            ("weight", "weight", "unsigned char", params["weight_value"].flatten()),
+            ("bias", "bias", "int32_t", params["bias"].flatten().astype(np.int64)),
+        ]
+    requantize = [
+        ("scale", "scales", "float", params["effective_scale"].flatten()),
+        ("scale", "shift", "int32_t", params["shift"].flatten()),
+        ("scale", "multiplier", "int32_t", params["multiplier"].flatten()),
+    ]
+    if op == "CONV_2D":
+        return [
+            ("weight", "weight", "unsigned char", params["weight_value"].flatten()),
+            ("bias", "bias", "int32_t", params["bias"].flatten().astype(np.int64)),
+        ] + requantize
+    if op == "DEPTHWISE_CONV_2D":
+        weight = params["weight_value"].reshape(-1)
+        channel = params["input_c"]
+        if params["kernel_h"] > params["kernel_w"]:
+            # HWC -> CWH
+            cwh = weight.reshape(params["kernel_h"], params["kernel_w"], channel).transpose(2, 1, 0)
+            return [("weight", "CWHweight", "unsigned char", cwh)]
+        bias, remainder = fuseDepthwiseBias(params["bias"].flatten(), params["input_zero_point"] * -1, weight, channel)
+        return [
+            # HWC -> CHW
+            ("weight", "CHWweight", "unsigned char", weight.reshape(-1, channel).T),
+            ("bias", "offsetBias", "int32_t", bias),
+            ("bias", "offsetRBias", "int32_t", remainder),
+        ] + requantize
+    return []
+
+
+def _contentDigest(contents):
+    h = hashlib.sha1()
+    for c in contents:
+        if isinstance(c, np.ndarray):
+            h.update(f"{c.dtype.str}{c.shape}".encode())
+            h.update(np.ascontiguousarray(c).tobytes())
+        else:
+            h.update(repr(c).encode())
+        h.update(b"|")
+    return h.digest()
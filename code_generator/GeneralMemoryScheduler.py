@@ -16,8 +16,15 @@
 # Target ISA:  ARMv7E-M
 # ----------------------------------------------------------------------
 
+import math
+
+from .allocator.branchBound import searchPlacement
 from .allocator.firstFit import FirstFit
-from .constant import TTYPE_INFERNECE
+from .allocator.strategy import allocateBest
+from .constant import TTYPE_INFERNECE, TTYPE_SCRATCH
+from .ConstantPool import ConstantPool, layerTables, storedTable
+from .InplaceUtil import assignInplaceGraphIdx, buildTensorIndex, getConcatViews
+from .LayerReorder import reorderLayers
 
 
 class GeneralMemoryScheduler:
@@ -29,8 +36,14 @@ class GeneralMemoryScheduler:
         memory_limit=10 * 1024 * 1024,
         inplace=True,
         outputTables=None,
-        mem_visual_path="codegen/allocation.png",
+        mem_visual_path=None,
         VisaulizeTrainable=True,
+        dedup_constants=True,
+        allocation_strategies=None,
+        placement_time_budget=0,
+        reorder_layers=True,
+        scoped_scratch=True,
+        mem_visual_background=False,
     ):
         self.layer = layer
         self.heads = 0
@@ -49,12 +62,28 @@ class GeneralMemoryScheduler:
         self.scale = 0
         self.code = 0
         self.allocator = FirstFit(memory_limit)
+        # names of the allocation strategies to try, None for all, see allocator/strategy.py
+        self.allocation_strategies = allocation_strategies
+        # seconds to search for a better placement with branch-and-bound, 0 to disable
+        self.placement_time_budget = placement_time_budget
+        # execute the layers in the topological order with the lowest peak activation memory
+        self.reorder_layers = reorder_layers
+        # place the scratch buffers (sbuf/kbuf) of each layer with the activations instead of after them
+        self.scoped_scratch = scoped_scratch
         self.outputTables = outputTables
         self.USE_INPLACE = inplace
+        # dump the placement to a .json file or render it to an image, None to skip
         self.mem_visual_path = mem_visual_path
+        # render the image in a background process instead of waiting for it
+        self.mem_visual_background = mem_visual_background
+        # process rendering the image in the background, see joinVisualization
+        self.visual_process = None
         self.tflite_op = tflite_op
         self.dummy_address = dummy_address
         self.VisaulizeTrainable = VisaulizeTrainable
+        # identical constant tables are only stored once, see CodeGenerator
+        self.dedup_constants = dedup_constants
+        self.constant_pool = ConstantPool()
 
         # for showing layer-wise memory usage
         self.layermem = []
@@ -66,27 +95,25 @@ class GeneralMemoryScheduler:
         return False
 
     def allocateMemory(self):
-        # assign the same graph index for inplace operations
-        # note: we need to handle stride == 2 for int8 depthwise to save memory
-        if self.USE_INPLACE:
-            for i, op in enumerate(self.layer):
-                if op.params["op"] == "DEPTHWISE_CONV_2D" and op.params["input_dtype"] == "int8" and not self.tflite_op:
-                    # set the idx of output and next layer input
-                    previous_output_idx = op.output_tensors[0].graph_idx
-                    op.output_tensors[0].graph_idx = op.input_tensors[0].graph_idx
-                    if (
-                        i + 1 < len(self.layer)
-                        and len(self.layer[i + 1].input_tensors) > 0
-                        and str(self.layer[i + 1].input_tensors[0].graph_idx) == str(previous_output_idx)
-                    ):
-                        self.layer[i + 1].input_tensors[0].graph_idx = op.input_tensors[0].graph_idx
-                    # update following ops' tensors
-                    for following_idx in range(i, len(self.layer)):
-                        for cnt, inp_tensor in enumerate(self.layer[following_idx].input_tensors):
-                            if str(inp_tensor.graph_idx) == str(previous_output_idx):
-                                inp_tensor.graph_idx = op.input_tensors[0].graph_idx
+        # patch-based layers are generated in their original order, with the shared scratch buffers
+        patch_based = any(op.params.get("is_patch", False) for op in self.layer)
+        if self.reorder_layers and not patch_based:
+            self._reorderLayers()
+        scoped_scratch = self.scoped_scratch and not patch_based
+
+        # assign the same graph index for inplace operations (int8 depthwise conv, pooling and add)
+        if self.USE_INPLACE and not self.tflite_op:
+            assignInplaceGraphIdx(self.layer)
 
         num_layers = len(self.layer)
+        tensor_ids, tensors, last_use = buildTensorIndex(self.layer)
+        # graph index of each input of an inplace concatenation -> (graph index of the output, offset in bytes)
+        views = getConcatViews(self.layer, tensor_ids, tensors, last_use) if self.USE_INPLACE else {}
+        view_host_keys = {host_key for host_key, _ in views.values()}
+        for op in self.layer:
+            if op.params["op"] == "CONCATENATION" and str(op.output_tensors[0].graph_idx) in view_host_keys:
+                # no code is generated for it
+                op.params["inplace"] = True
         # go through all tensors in the model
         for i, op in enumerate(self.layer):
             # get all unallocated tensors for this layer
@@ -94,42 +121,40 @@ class GeneralMemoryScheduler:
             for t in op.input_tensors:
                 if t.allocator_idx is None:
                     unallocated_tensors.append(t)
-            for cnt, t in enumerate(op.output_tensors):
-                if cnt == 0 and not (
-                    self.USE_INPLACE
-                    and op.params["op"] == "DEPTHWISE_CONV_2D"
-                    and op.params["input_dtype"] == "int8"
-                    and not self.tflite_op
-                ):
-                    if t.allocator_idx is None:
-                        unallocated_tensors.append(t)
-                # assume seocnd outputs will not be inplace updated
-                else:
-                    if t.allocator_idx is None:
-                        unallocated_tensors.append(t)
+            # assume seocnd outputs will not be inplace updated
+            for t in op.output_tensors:
+                if t.allocator_idx is None:
+                    unallocated_tensors.append(t)
 
             # add each tensor
             for cnt, t in enumerate(unallocated_tensors):
-                start_idx = i
-                end_idx = i + 1 if i == 0 else num_layers
-                for idx in range(start_idx + 1, num_layers):
-                    for input_t in self.layer[idx].input_tensors:
-                        if str(t.graph_idx) == str(input_t.graph_idx):
-                            end_idx = idx + 1
-                # check if this is output
-                ttype = TTYPE_INFERNECE
-                # add the tensor
-                t.allocator_idx = self.allocator.addTensor(start_idx, end_idx, t.len(), name=t.graph_idx, type=ttype)
-                # propagate the allocation to tensors with the same idx
-                for j in range(i + 1, num_layers):
-                    opp = self.layer[j]
-                    for tt in opp.input_tensors:
-                        if str(t.graph_idx) == str(tt.graph_idx):
-                            tt.allocator_idx = t.allocator_idx
-                    # not inplace update
-                    for tt in opp.output_tensors:
-                        if str(t.graph_idx) == str(tt.graph_idx):
-                            tt.allocator_idx = t.allocator_idx
+                tensor_id = tensor_ids[str(t.graph_idx)]
+                # the input of an inplace concatenation is a slice of the output, which is allocated from the first
+                # slice written on
+                host_id = tensor_ids[views[str(t.graph_idx)][0]] if str(t.graph_idx) in views else tensor_id
+                host = t if host_id == tensor_id else tensors[host_id][0][1]
+                if host.allocator_idx is None:
+                    start_idx = i
+                    # the tensor is alive until its last consumer, or until the end if no following layer reads it
+                    if last_use[host_id] > i:
+                        end_idx = last_use[host_id] + 1
+                    else:
+                        end_idx = i + 1 if i == 0 else num_layers
+                    # check if this is output
+                    ttype = TTYPE_INFERNECE
+                    # add the tensor
+                    host.allocator_idx = self.allocator.addTensor(
+                        start_idx, end_idx, host.len(), name=host.graph_idx, type=ttype
+                    )
+                    for j, tt in tensors[host_id]:
+                        if j >= i:
+                            tt.allocator_idx = host.allocator_idx
+                t.allocator_idx = host.allocator_idx
+                # propagate the allocation to tensors with the same idx in this and the following layers, e.g., the
+                # output of an inplace layer whose input first appears in the same layer
+                for j, tt in tensors[tensor_id]:
+                    if j >= i:
+                        tt.allocator_idx = t.allocator_idx
 
             # for detailed memory
             layermem = {}
@@ -139,8 +164,19 @@ class GeneralMemoryScheduler:
             layermem["scale"] = op.get_scale_size()
             layermem["runtime"] = op.get_sbuf_size()
             layermem["kernel"] = op.get_kbuf_size()
-            self._enlargeBuffer("im2col", layermem["runtime"])
-            self._enlargeBuffer("kernel", layermem["kernel"])
+            if scoped_scratch:
+                # the scratch buffers are only needed during this layer
+                for name, size in (("sbuf", layermem["runtime"]), ("kbuf", layermem["kernel"])):
+                    if size > 0:
+                        op.params[f"{name}_allocator_idx"] = self.allocator.addTensor(
+                            i, i + 1, math.ceil(size / 4) * 4, name=f"{name}{i}", type=TTYPE_SCRATCH
+                        )
+                    else:
+                        # no shared scratch buffer is generated, see CodeGenerator
+                        op.params[f"{name}_buf_add_offset"] = None
+            else:
+                self._enlargeBuffer("im2col", layermem["runtime"])
+                self._enlargeBuffer("kernel", layermem["kernel"])
 
             if (
                 "weight_name" in op.params
@@ -168,26 +204,34 @@ class GeneralMemoryScheduler:
                 layermem["scale"] = 0
                 layermem["bias"] = 0
                 layermem["weight"] = 0
+            self._countConstants(i, op, layermem)
             self.__increaseFlash(layermem["weight"])
             self.__increaseFlash(layermem["bias"])
             self.__increaseFlash(layermem["scale"])
 
             self.layermem.append(layermem)
 
-        # find out int8 inplace depthwise conv and stride == 2
+        # an inplace layer with a smaller output (e.g., strided depthwise conv or pooling) releases the rest of the
+        # buffer, only the tensors of the following layers need to be kept
+        view_hosts = {tensors[tensor_ids[host_key]][0][1].allocator_idx for host_key, _ in views.values()}
         for i, op in enumerate(self.layer):
-            if (
-                op.params["op"] == "DEPTHWISE_CONV_2D"
-                and op.params["input_dtype"] == "int8"
-                and op.params["stride_h"] == op.params["stride_w"] == 2
-            ):
-                if op.input_tensors[0].allocator_idx == op.output_tensors[0].allocator_idx:
-                    self.allocator.rectangles[op.input_tensors[0].allocator_idx]["stride2_inplace_idx"] = i
+            out = op.output_tensors[0]
+            if all(t.allocator_idx != out.allocator_idx for t in op.input_tensors) or out.allocator_idx in view_hosts:
+                continue
+            tensor_id = tensor_ids[str(out.graph_idx)]
+            needed = max([out.len()] + [t.len() for j, t in tensors[tensor_id] if j > i])
+            self.allocator.rectangle_by_idx[out.allocator_idx].shrink(i + 1, needed)
 
-        # Reorder the rectangles to decide which tensor needs to be scheduled first
-        self.allocator.sortSize()
-        self.allocator.allocate()
-        self.allocator.visualize(self.mem_visual_path)
+        # Place the tensors with each allocation strategy and keep the one with the lowest peak memory
+        self.allocator = allocateBest(self.allocator, self.allocation_strategies)
+        if self.placement_time_budget > 0:
+            lower_bound = searchPlacement(self.allocator, self.placement_time_budget)
+            print(
+                f"Peak memory after placement search: {self.allocator.get_peak()} bytes, "
+                f"lower bound: {lower_bound} bytes."
+            )
+        if self.mem_visual_path is not None:
+            self.visual_process = self.allocator.visualize(self.mem_visual_path, background=self.mem_visual_background)
         self._enlargeBuffer("input_output", self.allocator.get_peak())
 
         # sanity check, see if all tensors have been allocated
@@ -197,39 +241,95 @@ class GeneralMemoryScheduler:
                 assert t.allocator_idx is not None
             for cnt, t in enumerate(op.output_tensors):
                 assert t.allocator_idx is not None
+            # an inplace output is written through the input pointer, so it must share the allocation of the input
+            for t in op.output_tensors:
+                for inp in op.input_tensors:
+                    if str(inp.graph_idx) == str(t.graph_idx):
+                        assert (
+                            inp.allocator_idx == t.allocator_idx
+                        ), f"inplace output of layer {i} is not allocated over its input"
 
         # assign the address according to placement
         for i, op in enumerate(self.layer):
             # get all unallocated tensors for this layer
             for cnt, t in enumerate(op.input_tensors):
                 if cnt == 0:
-                    op.params["input_buf_add_offset"] = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.params["input_buf_add_offset"] = self._getTensorAddress(t, views)
                     op.params["input_buf_add"] = "front"
                 elif cnt == 1:
-                    op.params["input2_buf_add_offset"] = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.params["input2_buf_add_offset"] = self._getTensorAddress(t, views)
                     op.params["input2_buf_add"] = "front"
                 elif cnt == 2:
-                    op.params["input3_buf_add_offset"] = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.params["input3_buf_add_offset"] = self._getTensorAddress(t, views)
                     op.params["input3_buf_add"] = "front"
                 op.input_tensors[cnt].buffer_name = "buffer0"
-                op.input_tensors[cnt].buffer_address = self.allocator.getIdxAddress(t.allocator_idx)
+                op.input_tensors[cnt].buffer_address = self._getTensorAddress(t, views)
             for cnt, t in enumerate(op.output_tensors):
                 if cnt == 0:
-                    op.params["output_buf_add_offset"] = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.params["output_buf_add_offset"] = self._getTensorAddress(t, views)
                     op.params["output_buf_add"] = "front"
                     op.output_tensors[cnt].buffer_name = "buffer0"
-                    op.output_tensors[cnt].buffer_address = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.output_tensors[cnt].buffer_address = self._getTensorAddress(t, views)
                 if cnt == 1:
-                    op.params["output2_buf_add_offset"] = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.params["output2_buf_add_offset"] = self._getTensorAddress(t, views)
                     op.params["output2_buf_add"] = "front"
                     op.output_tensors[cnt].buffer_name = "buffer0"
-                    op.output_tensors[cnt].buffer_address = self.allocator.getIdxAddress(t.allocator_idx)
+                    op.output_tensors[cnt].buffer_address = self._getTensorAddress(t, views)
+            for name in ("sbuf", "kbuf"):
+                if f"{name}_allocator_idx" in op.params:
+                    op.params[f"{name}_buf_add_offset"] = self.allocator.getIdxAddress(
+                        op.params[f"{name}_allocator_idx"]
+                    )
 
         # calculate peak mem
         self.peakmem = (
             self.allocator.get_peak() + self.buffers["im2col"] + self.buffers["kernel"]  # + self.buffers["trainable"]
         )
 
+    def joinVisualization(self):
+        """Wait until the image rendered in the background is written, if any."""
+        if self.visual_process is not None:
+            self.visual_process.join()
+            self.visual_process = None
+
+    def __getstate__(self):
+        # the process rendering the image cannot be pickled, e.g., by CompileCache
+        state = self.__dict__.copy()
+        state["visual_process"] = None
+        return state
+
+    def _getTensorAddress(self, t, views):
+        address = self.allocator.getIdxAddress(t.allocator_idx)
+        if str(t.graph_idx) in views:
+            address += views[str(t.graph_idx)][1]
+        return address
+
+    def _reorderLayers(self):
+        order, peak = reorderLayers(self.layer, self.USE_INPLACE, self.tflite_op)
+        if order != list(range(len(self.layer))):
+            print(f"Reorder the layers for lower peak activation memory: {peak} bytes.")
+            # update the list in place since it is shared with others, e.g., detectionUtils
+            self.layer[:] = [self.layer[i] for i in order]
+
+    def _countConstants(self, idx, op, layermem):
+        # count the flash of the tables written by CodeGenerator, with dedup_constants a table is not counted again if
+        # an earlier one has the same content
+        if op.params.get("weight_value") is None:
+            return
+        sizes = {"weight": 0, "bias": 0, "scale": 0}
+        for key, name, ctype, values in layerTables(op.params):
+            # tables in SRAM, e.g., trainable ones, are not counted
+            if layermem[key] == 0:
+                continue
+            stored = storedTable(ctype, values)
+            if self.dedup_constants and self.constant_pool.addTable(f"{name}{idx}", ctype, stored) is not None:
+                layermem["dedup"] = layermem.get("dedup", 0) + stored.nbytes
+            else:
+                sizes[key] += stored.nbytes
+        for key, size in sizes.items():
+            if layermem[key] > 0:
+                layermem[key] = size
+
     def dumpLayerIndex(self):
         # header
         print("-" * 14 + " Tensor Allocation Details " + "-" * 14)
@@ -269,11 +369,15 @@ class GeneralMemoryScheduler:
 
         layermem = self.layermem
         self.__dumpMemInfo(layermem)
+        if self.constant_pool.saved_bytes > 0:
+            print(f"Deduplicated constants: {self.constant_pool.saved_bytes} bytes of flash saved")
 
     def __dumpMemInfo(self, layermem):
         string = "-------Schedule-------|"
         maxActive = self.buffers["input_output"]
         maxRuntime = self.buffers["im2col"] + self.buffers["kernel"]
+        # scratch buffers placed with the activations are counted in maxActive
+        maxLayerRuntime = max([mem["runtime"] + mem["kernel"] for mem in layermem] + [1])
         maxTrainable = self.buffers["trainable"]
         totalWeight = self.__sumKey(layermem, "weight")
         totalBias = self.__sumKey(layermem, "bias")
@@ -303,7 +407,7 @@ class GeneralMemoryScheduler:
                 SRAM += layermem[i]["activation"]
             if "runtime" in layermem[i]:
                 sbuf = layermem[i]["runtime"] + layermem[i]["kernel"]
-                substr = str(sbuf) + " (" + "{:.0%}".format(sbuf / maxRuntime) + ")"
+                substr = str(sbuf) + " (" + "{:.0%}".format(sbuf / (maxRuntime or maxLayerRuntime)) + ")"
                 string += substr.ljust(11) + "|"
                 SRAM += sbuf
             else:
@@ -0,0 +1,143 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   InplaceUtil.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+__all__ = ["assignInplaceGraphIdx", "getInplaceInputIdx", "buildTensorIndex", "getConcatViews"]
+
+
+def assignInplaceGraphIdx(layers):
+    """Assign the graph index of the input to the output of each inplace layer and the following readers of it.
+
+    The decisions depend on the execution order of layers, see getInplaceInputIdx. Shared by GeneralMemoryScheduler and
+    the liveness model of LayerReorder.
+    """
+    # graph index -> input tensors consuming it, as (layer index, tensor)
+    consumers = {}
+    # graph index -> size of the tensor when it first appears, i.e., the size it is allocated with
+    tensor_size = {}
+    for i, op in enumerate(layers):
+        for inp_tensor in op.input_tensors:
+            consumers.setdefault(str(inp_tensor.graph_idx), []).append((i, inp_tensor))
+            tensor_size.setdefault(str(inp_tensor.graph_idx), inp_tensor.len())
+        for out_tensor in op.output_tensors:
+            tensor_size.setdefault(str(out_tensor.graph_idx), out_tensor.len())
+    for i, op in enumerate(layers):
+        inplace_idx = getInplaceInputIdx(i, op, consumers, tensor_size)
+        if inplace_idx is None:
+            continue
+        # set the idx of output and following ops' input tensors
+        previous_output_idx = str(op.output_tensors[0].graph_idx)
+        op.output_tensors[0].graph_idx = inplace_idx
+        if previous_output_idx == str(inplace_idx):
+            continue
+        remaining = []
+        for following_idx, inp_tensor in consumers.pop(previous_output_idx, []):
+            if following_idx >= i:
+                inp_tensor.graph_idx = inplace_idx
+                consumers.setdefault(str(inplace_idx), []).append((following_idx, inp_tensor))
+            else:
+                remaining.append((following_idx, inp_tensor))
+        if len(remaining) > 0:
+            consumers[previous_output_idx] = remaining
+
+
+def getInplaceInputIdx(i, op, consumers, tensor_size):
+    # graph index of the input tensor that the output of layer i overwrites, None if not inplace
+    p = op.params
+    if p["op"] == "DEPTHWISE_CONV_2D" and p["input_dtype"] == "int8":
+        return op.input_tensors[0].graph_idx
+    if p["op"] in ("MAX_POOL_2D", "AVERAGE_POOL_2D") and p["input_dtype"] == p["output_dtype"] == "int8":
+        # the pooling kernels loop over channels first and read each window at or after the output element
+        # written, so the smaller output can be written over an input that no following layer reads
+        t = op.input_tensors[0]
+        key = str(t.graph_idx)
+        if tensor_size[key] == t.len() >= op.output_tensors[0].len() and all(j <= i for j, _ in consumers[key]):
+            return t.graph_idx
+    if (
+        p["op"] in ("ADD", "CONV_2D")
+        and p.get("input2_idx") is not None
+        and p["input_dtype"] == p["input2_dtype"] == p["output_dtype"] == "int8"
+    ):
+        # add_fpreq reads both inputs before writing each element, so the output can take over the buffer of an
+        # input of the same size that no following layer reads. A conv fused with the add (see LayerFusion) reads
+        # its own input ahead of the output, only the residual can be taken over.
+        output_size = op.output_tensors[0].len()
+        for t in op.input_tensors if p["op"] == "ADD" else op.input_tensors[1:]:
+            key = str(t.graph_idx)
+            if tensor_size[key] == t.len() == output_size and all(j <= i for j, _ in consumers[key]):
+                return t.graph_idx
+    return None
+
+
+def buildTensorIndex(layers):
+    """Index the tensors of all layers by graph index for the liveness analysis.
+
+    Returns the integer id of each graph index, the (layer index, tensor) pairs for each id, and the last layer
+    reading each id (-1 if no layer reads it).
+    """
+    tensor_ids = {}
+    tensors = []
+    last_use = []
+    for i, op in enumerate(layers):
+        for is_input, layer_tensors in ((True, op.input_tensors), (False, op.output_tensors)):
+            for t in layer_tensors:
+                key = str(t.graph_idx)
+                if key not in tensor_ids:
+                    tensor_ids[key] = len(tensors)
+                    tensors.append([])
+                    last_use.append(-1)
+                tensor_id = tensor_ids[key]
+                tensors[tensor_id].append((i, t))
+                if is_input:
+                    last_use[tensor_id] = i
+    return tensor_ids, tensors, last_use
+
+
+def getConcatViews(layers, tensor_ids, tensors, last_use):
+    """Find the concatenations whose inputs can be written by their producers into the slices of the output.
+
+    An input qualifies if it is produced by an earlier layer with the size of its slice and no layer reads it after
+    the concatenation, which then generates no code. Returns the graph index of the output and the byte offset of
+    the slice for the graph index of each input.
+    """
+    views = {}
+    for i, op in enumerate(layers):
+        if op.params["op"] != "CONCATENATION":
+            continue
+        offsets = op.sliceOffsets()
+        host_key = str(op.output_tensors[0].graph_idx)
+        keys = [str(t.graph_idx) for t in op.input_tensors]
+        if offsets is None or host_key in views or len(set(keys)) != len(keys):
+            continue
+        hosts = {h for h, _ in views.values()}
+        qualified = True
+        for key, t in zip(keys, op.input_tensors):
+            tensor_id = tensor_ids[key]
+            j, first = tensors[tensor_id][0]
+            if (
+                key in views
+                or key in hosts
+                or all(first is not out for out in layers[j].output_tensors)
+                or first.len() != t.len()
+                or last_use[tensor_id] != i
+            ):
+                qualified = False
+        if not qualified:
+            continue
+        for key, offset in zip(keys, offsets):
+            views[key] = (host_key, offset)
+    return views
@@ -18,23 +18,23 @@
 
 import math
 
-
-def _find_previous_info(layers, idx):
-    for layer in layers:
-        info = layer.get_layer_info()
-        if info["output_idx"] == idx:
-            return info
+from .ModelGraph import ModelGraph
+from .operators.concat import INPUT_PREFIXES
 
 
 class InputResizer:
     def __init__(self, layer):
         self.layer = layer
+        # built once, so that resizing is a single pass over the layers, e.g., for resolution sweeps
+        self.graph = ModelGraph(layer)
 
     def inputResize(self, input_h, input_w):
-        for i, layer in enumerate(self.layer):
+        for i in self.graph.topologicalOrder():
+            layer = self.layer[i]
             layer_info = layer.get_layer_info()
 
-            previous_layer_info = _find_previous_info(self.layer, layer_info["input_idx"])
+            previous_layer = self.graph.producerOf(layer_info["input_idx"])
+            previous_layer_info = None if previous_layer is None else previous_layer.get_layer_info()
             # we need to handle different op
             op_code_str = layer_info["op"]
             if i == 0:
@@ -62,26 +62,12 @@ class InputResizer:
 
                     # handle nodes for dag op
                     # find the previous node
-                    if "dagop_input0_key" in layer_info:
-                        for op in self.layer:
-                            l_into = op.get_layer_info()
-                            if (
-                                "dagop_output_key" in l_into
-                                and l_into["dagop_output_key"] == layer_info["dagop_input0_key"]
-                            ):
-                                layer_info["input_h"] = l_into["output_h"]
-                                layer_info["input_w"] = l_into["output_w"]
-                                layer_info["input_c"] = l_into["output_c"]
-                    if "dagop_input1_key" in layer_info:
-                        for op in self.layer:
-                            l_into = op.get_layer_info()
-                            if (
-                                "dagop_output_key" in l_into
-                                and l_into["dagop_output_key"] == layer_info["dagop_input1_key"]
-                            ):
-                                layer_info["input_h"] = l_into["output_h"]
-                                layer_info["input_w"] = l_into["output_w"]
-                                layer_info["input_c"] = l_into["output_c"]
+                    for key in ("dagop_input0_key", "dagop_input1_key"):
+                        if key in layer_info and self.graph.dagopProducerOf(layer_info[key]) is not None:
+                            l_into = self.graph.dagopProducerOf(layer_info[key]).get_layer_info()
+                            layer_info["input_h"] = l_into["output_h"]
+                            layer_info["input_w"] = l_into["output_w"]
+                            layer_info["input_c"] = l_into["output_c"]
 
             if op_code_str == "CONV_2D" or op_code_str == "DEPTHWISE_CONV_2D":
                 layer_info["output_h"] = math.ceil(layer_info["input_h"] / layer_info["stride_h"])
@@ -103,8 +89,13 @@ class InputResizer:
                 layer_info["output_w"] = SEinput_w
                 _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
             elif op_code_str == "UPSAMPLE":
-                layer_info["output_h"] = layer_info["input_h"] * layer_info["factor"]
-                layer_info["output_w"] = layer_info["input_w"] * layer_info["factor"]
+                layer_info["output_h"] = int(layer_info["input_h"] * layer_info["factor"])
+                layer_info["output_w"] = int(layer_info["input_w"] * layer_info["factor"])
+                layer_info["output_c"] = layer_info["input_c"]
+                _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
+            elif op_code_str == "PAD":
+                layer_info["output_h"] = layer_info["input_h"] + layer_info["pad_t"] + layer_info["pad_b"]
+                layer_info["output_w"] = layer_info["input_w"] + layer_info["pad_l"] + layer_info["pad_r"]
                 layer_info["output_c"] = layer_info["input_c"]
                 _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
             elif op_code_str == "MAX_POOL_2D":
@@ -112,6 +103,21 @@ class InputResizer:
                 layer_info["output_w"] = int(layer_info["input_w"] / layer_info["filter_h"])
                 layer_info["output_c"] = layer_info["input_c"]
                 _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
+            elif op_code_str == "CONCATENATION":
+                # the other inputs follow their producers too, the output adds up along the axis
+                prefixes = INPUT_PREFIXES[: len(self.layer[i].input_tensors)]
+                for k, prefix in enumerate(prefixes[1:], start=1):
+                    producer = self.graph.producerOf(layer_info[f"{prefix}_idx"])
+                    if producer is None:
+                        continue
+                    for dim in ("h", "w", "c"):
+                        layer_info[f"{prefix}_{dim}"] = producer.get_layer_info()[f"output_{dim}"]
+                    _changeOPTensorSize(self.layer[i], "input", k, layer_info[f"{prefix}_h"], layer_info[f"{prefix}_w"])
+                axis = {1: "h", 2: "w", 3: "c"}[layer_info["axis"]]
+                for dim in ("h", "w", "c"):
+                    layer_info[f"output_{dim}"] = layer_info[f"input_{dim}"]
+                layer_info[f"output_{axis}"] = sum(layer_info[f"{prefix}_{axis}"] for prefix in prefixes)
+                _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
 
 
 def _changeOPTensorSize(layer, tensor_type: str, tensor_idx: int, input_h: int, input_w: int):
@@ -163,5 +169,6 @@ class PatchResizer:
                     layer_info["input2_w"] = layer_info["input_w"]
                     _changeOPTensorSize(self.layer[i], "input", 0, layer_info["input_h"], layer_info["input_w"])
                     _changeOPTensorSize(self.layer[i], "input", 1, layer_info["input_h"], layer_info["input_w"])
+                    _changeOPTensorSize(self.layer[i], "output", 0, layer_info["output_h"], layer_info["output_w"])
             else:
                 layer_info["is_patch"] = False
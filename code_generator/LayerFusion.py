@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   LayerFusion.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+from .ModelGraph import ModelGraph
+from .operators.conv2d import UNROLLED_INPUT_CHANNELS
+
+__all__ = ["fuseConvAdd"]
+
+# params of the residual taken over from the ADD, with the prefix of the residual input
+RESIDUAL_KEYS = ("idx", "h", "w", "c", "dtype", "zero_point", "scale")
+
+
+def fuseConvAdd(layers, use_aggressive_unroll=True):
+    """Fuse each 1x1 conv into the residual ADD reading its output, see convolve_1x1_s8_fpreq_add.
+
+    The conv takes the other input of the ADD as input2 (the residual) and the output of the ADD, the ADD is removed.
+    Its intermediate output is requantized as before in the epilogue, so the results are the same as with add_fpreq.
+    The fused layer is at the position of the ADD, where the residual is ready. With use_aggressive_unroll, the convs
+    generated with an unrolled kernel (convolve_1x1_s8_ch*) are kept as they are. layers is updated in place, returns
+    the number of fused layers.
+    """
+    graph = ModelGraph(layers)
+    fused = {}
+    for i, op in enumerate(layers):
+        if not _isFusibleConv(op, use_aggressive_unroll):
+            continue
+        consumers = graph.consumers.get(str(op.params["output_idx"]), [])
+        if len(consumers) != 1 or not _isFusibleAdd(layers[consumers[0]], op):
+            continue
+        fused[consumers[0]] = i
+
+    for add_idx, conv_idx in fused.items():
+        _fuse(layers[conv_idx], layers[add_idx])
+        layers[add_idx] = layers[conv_idx]
+    # update the list in place since it is shared with others, e.g., detectionUtils
+    layers[:] = [op for i, op in enumerate(layers) if i not in fused.values()]
+    return len(fused)
+
+
+def _isFusibleConv(op, use_aggressive_unroll):
+    p = op.params
+    # the unrolled kernels are faster than the generic one of the fused conv, see Conv2d.generate_inference_str
+    unrolled = use_aggressive_unroll and p["output_c"] % 2 == 0 and p["input_c"] in UNROLLED_INPUT_CHANNELS
+    return (
+        p["op"] == "CONV_2D"
+        and p["kernel_h"] == p["kernel_w"] == 1
+        and p["stride_h"] == p["stride_w"] == 1
+        and p["input_dtype"] == p["output_dtype"] == "int8"
+        and p["input_c"] % 4 == 0
+        and not unrolled
+        and not p.get("is_patch", False)
+        and p.get("input2_idx") is None
+    )
+
+
+def _isFusibleAdd(add, conv):
+    p = add.params
+    conv_output = str(conv.params["output_idx"])
+    return (
+        p["op"] == "ADD"
+        and p["input_dtype"] == p["input2_dtype"] == p["output_dtype"] == "int8"
+        and [str(p["input_idx"]), str(p["input2_idx"])].count(conv_output) == 1
+        and add.output_tensors[0].len() == conv.output_tensors[0].len()
+    )
+
+
+def _fuse(conv, add):
+    p = conv.params
+    residual = "input2" if str(add.params["input_idx"]) == str(p["output_idx"]) else "input"
+    # the conv requantizes to its own output first, the layer output is the one of the ADD
+    p["conv_output_scale"] = p["output_scale"]
+    p["conv_output_zero_point"] = p["output_zero_point"]
+    for key in RESIDUAL_KEYS:
+        p[f"input2_{key}"] = add.params[f"{residual}_{key}"]
+    p["output_scale"] = add.params["output_scale"]
+    p["output_zero_point"] = add.params["output_zero_point"]
+    conv._add_input(p["input2_idx"], p["input2_dtype"], p["input2_c"], p["input2_w"], p["input2_h"])
+    conv.change_output_tensor_idx(add.params["output_idx"])
@@ -0,0 +1,224 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   LayerReorder.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import copy
+import heapq
+
+from .InplaceUtil import assignInplaceGraphIdx, buildTensorIndex, getConcatViews
+
+__all__ = ["LayerGraph", "reorderLayers"]
+
+
+def _inplaceLayers(layers, tflite_op):
+    """Return copies of layers with the graph indices that GeneralMemoryScheduler assigns to inplace layers.
+
+    The copies share everything but the tensors with the layers, which are left as is. Also return the graph index of
+    the output that each input of an inplace concatenation is a slice of.
+    """
+    copies = []
+    for op in layers:
+        op_copy = copy.copy(op)
+        op_copy.input_tensors = [copy.copy(t) for t in op.input_tensors]
+        op_copy.output_tensors = [copy.copy(t) for t in op.output_tensors]
+        copies.append(op_copy)
+    if not tflite_op:
+        assignInplaceGraphIdx(copies)
+    views = getConcatViews(copies, *buildTensorIndex(copies))
+    return copies, {key: host_key for key, (host_key, _) in views.items()}
+
+
+class LayerGraph:
+    """Dataflow graph of the layers for estimating the live activation memory of an execution order.
+
+    Tensors are grouped into buffers as in GeneralMemoryScheduler, e.g., the output of an inplace layer shares the
+    buffer of its input and the inputs of an inplace concatenation are slices of its output. A buffer is live from its
+    first producer until all of its consumers are executed, buffers without consumers are model outputs and live until
+    the end.
+    """
+
+    def __init__(self, layers, inplace=True, tflite_op=False):
+        num = len(layers)
+        host_of = {}
+        if inplace:
+            layers, host_of = _inplaceLayers(layers, tflite_op)
+        # graph index of the output of each inplace concatenation -> its size
+        host_size = {
+            str(op.output_tensors[0].graph_idx): op.output_tensors[0].len()
+            for op in layers
+            if op.params["op"] == "CONCATENATION" and str(op.output_tensors[0].graph_idx) in host_of.values()
+        }
+        buffer_of = {}
+        self.buffer_size = []
+        # per layer: bitmask of the layers to execute before it, buffers read, buffers written, buffers allocated if
+        # not allocated by an earlier layer
+        self.preds = [0] * num
+        self.reads = [[] for _ in range(num)]
+        self.writes = [[] for _ in range(num)]
+        self.allocs = [[] for _ in range(num)]
+        producer = {}
+        consumers = {}
+        # graph index -> (layer index, size) of the input tensors reading it
+        reader_size = {}
+
+        def getBuffer(t):
+            key = host_of.get(str(t.graph_idx), str(t.graph_idx))
+            if key not in buffer_of:
+                buffer_of[key] = len(self.buffer_size)
+                self.buffer_size.append(host_size.get(key, t.len()))
+            return buffer_of[key]
+
+        for i, op in enumerate(layers):
+            for t in op.input_tensors:
+                b = getBuffer(t)
+                if b not in self.reads[i]:
+                    self.reads[i].append(b)
+                # data dependency
+                if str(t.graph_idx) in producer:
+                    self.preds[i] |= 1 << producer[str(t.graph_idx)]
+                consumers.setdefault(str(t.graph_idx), []).append(i)
+                reader_size.setdefault(str(t.graph_idx), []).append((i, t.len()))
+            for t in op.output_tensors:
+                producer[str(t.graph_idx)] = i
+                b = getBuffer(t)
+                self.writes[i].append(b)
+                if b not in self.reads[i]:
+                    self.allocs[i].append(b)
+
+        # per layer: (buffer, size) of the inplace buffer that only needs the size from the next layer on
+        self.shrinks = [[] for _ in range(num)]
+        for i, op in enumerate(layers):
+            # an inplace layer overwrites its input, other readers of the input keep their order relative to it
+            output_key = str(op.output_tensors[0].graph_idx)
+            if any(str(t.graph_idx) == output_key for t in op.input_tensors):
+                # a smaller output releases the rest of the buffer, as in GeneralMemoryScheduler
+                b = buffer_of[output_key]
+                needed = max([op.output_tensors[0].len()] + [size for j, size in reader_size[output_key] if j > i])
+                if output_key not in host_size and needed < self.buffer_size[b]:
+                    self.shrinks[i].append((b, needed))
+                for j in consumers[output_key]:
+                    if j < i:
+                        self.preds[i] |= 1 << j
+                    elif j > i:
+                        self.preds[j] |= 1 << i
+            # the inputs of an inplace concatenation are not read after it
+            if op.params["op"] == "CONCATENATION" and output_key in host_size:
+                for t in op.input_tensors:
+                    for j in consumers[str(t.graph_idx)]:
+                        if j != i:
+                            self.preds[i] |= 1 << j
+
+        self.succs = [[] for _ in range(num)]
+        for i in range(num):
+            for j in range(num):
+                if self.preds[j] >> i & 1:
+                    self.succs[i].append(j)
+
+        self.consumers = [0] * len(self.buffer_size)
+        self.producers = [0] * len(self.buffer_size)
+        # per buffer: (layer, size) of its shrinks
+        self.buffer_shrinks = [[] for _ in range(len(self.buffer_size))]
+        for i in range(num):
+            for b in self.reads[i]:
+                self.consumers[b] |= 1 << i
+            for b in self.allocs[i]:
+                self.producers[b] |= 1 << i
+            for b, size in self.shrinks[i]:
+                self.buffer_shrinks[b].append((i, size))
+        self.num = num
+
+    def sizeAfter(self, done, b):
+        """Size of buffer b after the layers in the bitmask done."""
+        return min([self.buffer_size[b]] + [size for i, size in self.buffer_shrinks[b] if done >> i & 1])
+
+    def step(self, done, live, i):
+        """Execute layer i after the layers in the bitmask done with live bytes, return (peak, live) of the step."""
+        # the slices of an inplace concatenation are written by several layers into one buffer
+        peak = live + sum(self.buffer_size[b] for b in self.allocs[i] if self.producers[b] & done == 0)
+        released = sum(self.sizeAfter(done, b) - self.sizeAfter(done | 1 << i, b) for b, _ in self.shrinks[i])
+        done |= 1 << i
+        # the buffers written by the layer are kept, e.g., the output of an inplace layer without consumers
+        freed = sum(
+            self.sizeAfter(done, b) for b in self.reads[i] if self.consumers[b] & ~done == 0 and b not in self.writes[i]
+        )
+        return peak, peak - freed - released
+
+    def initialLive(self):
+        # model inputs, i.e., buffers read before being produced by any layer
+        produced = set(b for allocs in self.allocs for b in allocs)
+        return sum(self.buffer_size[b] for b in range(len(self.buffer_size)) if b not in produced)
+
+    def getPeak(self, order):
+        done, live = 0, self.initialLive()
+        peak = live
+        for i in order:
+            assert self.preds[i] & ~done == 0, "not a topological order"
+            step_peak, live = self.step(done, live, i)
+            peak = max(peak, step_peak)
+            done |= 1 << i
+        return peak
+
+
+def reorderLayers(layers, inplace=True, tflite_op=False, max_states=1000):
+    """Search a topological order of layers with lower peak live activation memory.
+
+    The search goes through the sets of executed layers level by level, keeping the lowest peak to reach each set
+    (exact dynamic programming). If a level has more than max_states sets, only the max_states ones with the lowest
+    (peak, live) are kept (beam search). The first layer stays first since it takes the model input.
+
+    Return the new order as a list of layer indices and its peak, or the original order if nothing better is found.
+    """
+    graph = LayerGraph(layers, inplace, tflite_op)
+    num = graph.num
+    original = list(range(num))
+    original_peak = graph.getPeak(original) if num > 0 else 0
+    if num <= 2:
+        return original, original_peak
+
+    peak, live = graph.step(0, graph.initialLive(), 0)
+    # done bitmask -> (peak, live, parent done bitmask, layer executed last)
+    levels = [{1: (peak, live, None, 0)}]
+    # done bitmask -> layers ready to execute, for the sets of the last level
+    ready = {1: frozenset(i for i in range(1, num) if graph.preds[i] & ~1 == 0)}
+    for _ in range(num - 1):
+        next_level = {}
+        for done, (peak, live, _, _) in levels[-1].items():
+            for i in ready[done]:
+                step_peak, step_live = graph.step(done, live, i)
+                new_done = done | 1 << i
+                new_peak = max(peak, step_peak)
+                if new_done not in next_level or new_peak < next_level[new_done][0]:
+                    next_level[new_done] = (new_peak, step_live, done, i)
+        if len(next_level) > max_states:
+            next_level = dict(heapq.nsmallest(max_states, next_level.items(), key=lambda kv: (kv[1][0], kv[1][1])))
+        ready = {done: _readyAfter(graph, done, ready[parent], i) for done, (_, _, parent, i) in next_level.items()}
+        levels.append(next_level)
+
+    done, (best_peak, _, _, _) = next(iter(levels[-1].items()))
+    if best_peak >= original_peak:
+        return original, original_peak
+    order = []
+    for level in reversed(levels):
+        _, _, parent, i = level[done]
+        order.append(i)
+        done = parent
+    return order[::-1], best_peak
+
+
+def _readyAfter(graph, done, ready, i):
+    # layers ready to execute after executing layer i
+    return ready.difference([i]).union(j for j in graph.succs[i] if not done >> j & 1 and graph.preds[j] & ~done == 0)
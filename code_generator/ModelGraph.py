@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   ModelGraph.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+
+import heapq
+
+__all__ = ["ModelGraph"]
+
+# params of the tensors read by a layer
+INPUT_KEYS = ("input_idx", "input2_idx", "input3_idx")
+
+
+class ModelGraph:
+    """Graph view of a list of layers: the layer producing and the layers reading each tensor.
+
+    Tensors are identified by the input/output indices in the params of the layers (as strings), which do not change
+    when the scheduler renames the tensors of inplace layers. The maps are built once, so that looking up the producer
+    of a tensor is O(1) instead of a scan over all layers.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+        # tensor index -> index of the layer producing it
+        self.producer = {}
+        # tensor index -> indices of the layers reading it
+        self.consumers = {}
+        # dagop key -> index of the layer producing it
+        self.dagop_producer = {}
+        for i, op in enumerate(layers):
+            for key in self.inputs(i):
+                self.consumers.setdefault(key, []).append(i)
+            self.producer.setdefault(str(op.params["output_idx"]), i)
+            if "dagop_output_key" in op.params:
+                self.dagop_producer.setdefault(op.params["dagop_output_key"], i)
+
+    def inputs(self, i):
+        """Return the indices of the tensors read by layer i."""
+        params = self.layers[i].params
+        return [str(params[key]) for key in INPUT_KEYS if params.get(key) is not None]
+
+    def producerOf(self, key):
+        """Return the layer producing the tensor, None for the model inputs."""
+        i = self.producer.get(str(key))
+        return None if i is None else self.layers[i]
+
+    def dagopProducerOf(self, key):
+        i = self.dagop_producer.get(key)
+        return None if i is None else self.layers[i]
+
+    def predecessors(self, i):
+        return [self.producer[key] for key in self.inputs(i) if key in self.producer and self.producer[key] != i]
+
+    def topologicalOrder(self):
+        """Return the indices of the layers in a topological order, keeping the list order where it is valid."""
+        indegree = [0] * len(self.layers)
+        successors = [[] for _ in self.layers]
+        for i in range(len(self.layers)):
+            for j in set(self.predecessors(i)):
+                indegree[i] += 1
+                successors[j].append(i)
+        ready = [i for i, d in enumerate(indegree) if d == 0]
+        heapq.heapify(ready)
+        order = []
+        while len(ready) > 0:
+            i = heapq.heappop(ready)
+            order.append(i)
+            for j in successors[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    heapq.heappush(ready, j)
+        assert len(order) == len(self.layers), "the layers have a cycle"
+        return order
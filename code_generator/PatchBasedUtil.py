@@ -16,6 +16,23 @@
 # Target ISA:  ARMv7E-M
 # ----------------------------------------------------------------------
 
+import contextlib
+import copy
+import io
+import multiprocessing
+
+from .GeneralMemoryScheduler import GeneralMemoryScheduler
+from .InputResizer import PatchResizer
+
+# ops that PatchResizer can resize to a patch
+PATCH_OPS = ("CONV_2D", "DEPTHWISE_CONV_2D", "ADD")
+# downsampling of the split feature map, CodeGenerator assembles it from patches of three stride 2 convs
+FEAT_STRIDE = 8
+
+# layers of the model to search the patch parameters for, shared with the worker processes
+_search_layers = None
+
+
 def getPatchParams(layers, split_idx, n_patch):
     patch_params = {}
 
@@ -83,3 +100,76 @@ def compute_receptive_field(layers, layer_cnt, grain=1):
             pass
 
     return grain
+
+
+def searchPatchParams(layers, sram_budget=None, n_patches=(2, 3, 4, 5, 6, 7, 8), split_indices=None, processes=None):
+    """Sweep the split index and the number of patches of patch-based inference.
+
+    Each candidate is resized with PatchResizer and scheduled with GeneralMemoryScheduler, in parallel across cores.
+    Only splits at the feature map downsampled FEAT_STRIDE times are tried, and per-layer inference (split_idx 0,
+    n_patch 1) is evaluated as well. Returns the Pareto front of peak SRAM vs MACs, sorted by peak SRAM, or with
+    sram_budget, the candidate with the lowest MACs fitting into it (None if none fits).
+    """
+    if split_indices is None:
+        split_indices = []
+        for split_idx in range(1, len(layers)):
+            if layers[split_idx - 1].params["op"] not in PATCH_OPS:
+                break
+            split_indices.append(split_idx)
+
+    candidates = [(0, 1)]
+    resolution = max(layers[0].params["input_h"], layers[0].params["input_w"])
+    for split_idx in split_indices:
+        out_shape = max(layers[split_idx].params["input_h"], layers[split_idx].params["input_w"])
+        # only splits after the downsampling that the generated code expects, with patches covering the feature map
+        # evenly
+        if out_shape * FEAT_STRIDE != resolution:
+            continue
+        candidates += [
+            (split_idx, n_patch) for n_patch in n_patches if n_patch <= out_shape and out_shape % n_patch == 0
+        ]
+
+    global _search_layers
+    _search_layers = layers
+    if processes != 1 and "fork" in multiprocessing.get_all_start_methods():
+        # the forked workers share the layers instead of receiving a copy with each candidate
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            results = pool.starmap(_evaluatePatchParams, candidates)
+    else:
+        results = [_evaluatePatchParams(*c) for c in candidates]
+    _search_layers = None
+
+    if sram_budget is not None:
+        fitting = [r for r in results if r["peak_mem"] <= sram_budget]
+        return min(fitting, key=lambda r: (r["macs"], r["peak_mem"])) if len(fitting) > 0 else None
+
+    front = []
+    for r in sorted(results, key=lambda r: (r["peak_mem"], r["macs"])):
+        if len(front) == 0 or r["macs"] < front[-1]["macs"]:
+            front.append(r)
+    return front
+
+
+def _evaluatePatchParams(split_idx, n_patch):
+    layers = copy.deepcopy(_search_layers)
+    base_macs = sum(op.get_macs() for op in layers)
+    patch_params = None
+    # the split feature map is assembled from the patches in a separate buffer
+    feature_size = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        if n_patch > 1:
+            patch_params = getPatchParams(layers, split_idx, n_patch)
+            PatchResizer(layers).patchResize(split_idx, patch_params["grain_rf"], patch_params["grain_rf_height"])
+            feature_size = layers[split_idx].input_tensors[0].len()
+        memory_scheduler = GeneralMemoryScheduler(layers, outputTables=[])
+        memory_scheduler.allocateMemory()
+    # the layers before the split are run once for each patch
+    macs = sum(op.get_macs() * (n_patch**2 if i < split_idx else 1) for i, op in enumerate(layers))
+    return {
+        "split_idx": split_idx,
+        "n_patch": n_patch,
+        "peak_mem": memory_scheduler.peakmem + feature_size,
+        "macs": macs,
+        "recompute_macs": macs - base_macs,
+        "patch_params": patch_params,
+    }
@@ -0,0 +1,106 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   QuantizationUtil.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import numpy as np
+
+ADD_LEFT_SHIFT = 20
+
+
+# follows tensorflow lite micro: scale = significand * 2^(shift - 31), vectorized over all given scales
+def getMultiplierShift(effective_scale):
+    significand, shift = np.frexp(np.asarray(effective_scale, dtype=np.float64))
+    # np.round rounds half to even, same as round() of python
+    significand = np.round(significand * 2**31)
+
+    overflow = significand == 2**31
+    significand = np.where(overflow, significand / 2, significand)
+    shift = np.where(overflow, shift + 1, shift)
+
+    underflow = shift < -31
+    significand = np.where(underflow, 0, significand)
+    shift = np.where(underflow, 0, shift)
+
+    return significand.astype("int32"), shift.astype("int32")
+
+
+def getSigShift(s):
+    significand, shift = getMultiplierShift([s])
+    return int(significand[0]), int(shift[0])
+
+
+def getADDMultiplierShift(input_scale, input2_scale, output_scale):
+    input_scale = np.asarray(input_scale, dtype=np.double)
+    input2_scale = np.asarray(input2_scale, dtype=np.double)
+    output_scale = np.asarray(output_scale, dtype=np.double)
+
+    twice_max_input_scale = 2 * np.maximum(input_scale, input2_scale)
+    real_input1_multiplier = input_scale / twice_max_input_scale
+    real_input2_multiplier = input2_scale / twice_max_input_scale
+    real_output_multiplier = twice_max_input_scale / ((1 << ADD_LEFT_SHIFT) * output_scale)
+
+    input_multiplier, input_shift = getMultiplierShift(real_input1_multiplier)
+    input2_multiplier, input2_shift = getMultiplierShift(real_input2_multiplier)
+    output_multiplier, output_shift = getMultiplierShift(real_output_multiplier)
+
+    return (
+        ADD_LEFT_SHIFT,
+        input_multiplier,
+        input_shift,
+        input2_multiplier,
+        input2_shift,
+        output_multiplier,
+        output_shift,
+    )
+
+
+def requantizeLayers(layers):
+    """Recompute the requantization parameters of all layers in one batch, e.g., after changing scales."""
+    # per-channel multiplier/shift of conv, depthwise and fully connected layers
+    conv_params = [op.params for op in layers if op.params.get("effective_scale") is not None]
+    if len(conv_params) > 0:
+        scales = [np.asarray(p["effective_scale"], dtype=np.float64).reshape(-1) for p in conv_params]
+        multiplier, shift = getMultiplierShift(np.concatenate(scales))
+        split_idx = np.cumsum([len(s) for s in scales])[:-1]
+        for p, m, s in zip(conv_params, np.split(multiplier, split_idx), np.split(shift, split_idx)):
+            p["multiplier"] = m
+            p["shift"] = s
+
+    # per-tensor multiplier/shift of add layers
+    add_params = [op.params for op in layers if op.params["op"] == "ADD" and op.params.get("input_scale") is not None]
+    if len(add_params) > 0:
+        (
+            left_shift,
+            input_multiplier,
+            input_shift,
+            input2_multiplier,
+            input2_shift,
+            output_multiplier,
+            output_shift,
+        ) = getADDMultiplierShift(
+            [p["input_scale"] for p in add_params],
+            [p["input2_scale"] for p in add_params],
+            [p["output_scale"] for p in add_params],
+        )
+        for i, p in enumerate(add_params):
+            p["left_shift"] = left_shift
+            p["input_multiplier"] = int(input_multiplier[i])
+            p["input_shift"] = int(input_shift[i])
+            p["input2_multiplier"] = int(input2_multiplier[i])
+            p["input2_shift"] = int(input2_shift[i])
+            p["output_multiplier"] = int(output_multiplier[i])
+            p["output_shift"] = int(output_shift[i])
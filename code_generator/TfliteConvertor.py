@@ -17,14 +17,18 @@
 # ----------------------------------------------------------------------
 
 import math
+import mmap
 
 import numpy as np
 
-from .constant import SKIP_OPs
-from .operators import add, avgpool2d, conv2d, depthwiseConv2d, maxpool2d, upsample
+from .constant import ALIAS_OPs, QUANTIZE_OPs
+from .ModelGraph import INPUT_KEYS
+from .operators import add, avgpool2d, concat, conv2d, depthwiseConv2d, maxpool2d, pad, upsample
+from .QuantizationUtil import getADDMultiplierShift, getMultiplierShift, getSigShift
 from .tflite import Model
 from .tflite.BuiltinOperator import BuiltinOperator
 from .tflite.BuiltinOptions import BuiltinOptions
+from .tflite.ConcatenationOptions import ConcatenationOptions
 from .tflite.Conv2DOptions import Conv2DOptions
 from .tflite.DepthwiseConv2DOptions import DepthwiseConv2DOptions
 from .tflite.Padding import Padding
@@ -34,21 +38,33 @@ from .tflite.TensorType import TensorType
 
 # Parse tflite model into TinyEngine IR format
 class TfliteConvertor(object):
-    def __init__(self, filepath):
+    def __init__(self, filepath, use_mmap=True):
         # path to the tflite file
         self.filepath = filepath
+        self.use_mmap = use_mmap
         self.model = self.loadTFmodel(filepath)
         self.subgraph = self.model.Subgraphs(0)
+        self.tensor_table = TFLiteTensorTable(self.model, self.subgraph)
         self.builtin_op_code = self._build_str_map(BuiltinOperator())
         self.layer = []
-        self.tmpPADIndice = None
+        # output tensor index -> PAD to be folded into the layers reading it, or kept as a layer
+        self.pads = {}
+        # output tensor index -> input tensor index of reshape-like ops, the layers read the input directly
+        self.aliases = {}
+        # float output tensor index -> int8 input tensor index of DEQUANTIZE
+        self.dequantized = {}
         self.skip_transpose = None
         self.average_1D_to_2D_holder = MEAN2D()
 
     # public functions
     def loadTFmodel(self, filepath):
-        buf = open(filepath, "rb").read()
-        return Model.Model.GetRootAsModel(buf, 0)
+        with open(filepath, "rb") as f:
+            if self.use_mmap:
+                # read-only mapping: the flatbuffer and all weight arrays are views into the page cache, not copies
+                self.model_buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.model_buffer = f.read()
+        return Model.Model.GetRootAsModel(self.model_buffer, 0)
 
     def dumpModelInfo(self):
         version = self.model.Version()
@@ -95,6 +111,9 @@ class TfliteConvertor(object):
             # parse the op
             self._handleOperator(op)
 
+        self._resolveAliases()
+        self._foldPads()
+
     # private functions
     def _build_str_map(self, obj):
         ret = {}
@@ -119,54 +138,13 @@ class TfliteConvertor(object):
             return "float32"
 
     def _getMultiplierShift(self, effective_scale):
-        significand = np.zeros(len(effective_scale), dtype="int32")
-        shift = np.zeros(len(effective_scale), dtype="int32")
-
-        for i, s in enumerate(effective_scale):
-            if s == 0:
-                significand[i] = 0
-                shift[i] = 0
-            else:
-                sig, shi = math.frexp(s)
-                sig = int(round(sig * 2**31))
-
-                if sig == 2**31:
-                    sig /= 2
-                    shi += 1
-                if shi < -31:
-                    shi = 0
-                    sig = 0
-
-                significand[i] = sig
-                shift[i] = shi
-
-        return significand, shift
+        return getMultiplierShift(effective_scale)
 
     def _getSigShift(self, s):
-        sig, shi = math.frexp(s)
-        sig = int(round(sig * 2**31))
-        if sig == 2**31:
-            sig /= 2
-            shi += 1
-        if shi < -31:
-            shi = 0
-            sig = 0
-
-        return sig, shi
+        return getSigShift(s)
 
     def _getADDMultiplierShift(self, input_scale, input2_scale, output_scale):
-        left_shift = 20
-
-        twice_max_input_scale = 2 * np.double(max(input_scale, input2_scale))
-        real_input1_multiplier = np.double(input_scale / twice_max_input_scale)
-        real_input2_multiplier = np.double(input2_scale / twice_max_input_scale)
-        real_output_multiplier = np.double(twice_max_input_scale / ((1 << left_shift) * output_scale))
-
-        input_multiplier, input_shift = self._getSigShift(real_input1_multiplier)
-        input2_multiplier, input2_shift = self._getSigShift(real_input2_multiplier)
-        output_multiplier, output_shift = self._getSigShift(real_output_multiplier)
-
-        return (
+        (
             left_shift,
             input_multiplier,
             input_shift,
@@ -174,6 +152,16 @@ class TfliteConvertor(object):
             input2_shift,
             output_multiplier,
             output_shift,
+        ) = getADDMultiplierShift(input_scale, input2_scale, output_scale)
+
+        return (
+            left_shift,
+            int(input_multiplier),
+            int(input_shift),
+            int(input2_multiplier),
+            int(input2_shift),
+            int(output_multiplier),
+            int(output_shift),
         )
 
     def _preprocessSoftmaxScaling(self, beta, input_scale, input_integer_bits):
@@ -228,18 +216,18 @@ class TfliteConvertor(object):
         stride_w = conv_options.StrideW()
 
         # shapes
-        _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
+        _, input_h, input_w, input_c = input_tensor.shape
         if op_code_str == "CONV_2D":
-            output_c, kernel_h, kernel_w, _ = weight_tensor.tensor.ShapeAsNumpy()
+            output_c, kernel_h, kernel_w, _ = weight_tensor.shape
         elif op_code_str == "DEPTHWISE_CONV_2D":
-            _, kernel_h, kernel_w, output_c = weight_tensor.tensor.ShapeAsNumpy()
-        _, output_h, output_w, output_c_dual = output_tensor.tensor.ShapeAsNumpy()
+            _, kernel_h, kernel_w, output_c = weight_tensor.shape
+        _, output_h, output_w, output_c_dual = output_tensor.shape
         assert output_c_dual == output_c, "output channels not match"
 
         # tensor types
-        input_type = self._getTensorTypeStr(input_tensor.tensor.Type())
-        output_type = self._getTensorTypeStr(output_tensor.tensor.Type())
-        weight_type = self._getTensorTypeStr(weight_tensor.tensor.Type())
+        input_type = self._getTensorTypeStr(input_tensor.type)
+        output_type = self._getTensorTypeStr(output_tensor.type)
+        weight_type = self._getTensorTypeStr(weight_tensor.type)
         assert input_type == output_type == weight_type, "tensor type not consistent"
 
         # tensor value: weight, scalers
@@ -262,19 +250,6 @@ class TfliteConvertor(object):
         # quantized inference, used for requantize
         multiplier, shift = self._getMultiplierShift(effective_scale)
 
-        # find previous layer and redirct the index and fuse pad into conv
-        if self.tmpPADIndice is not None:
-            if self.tmpPADIndice.output_idx == input_tensor.tensor_idx:
-                input_idx = self.tmpPADIndice.input_idx
-                input_h = input_h - math.floor(kernel_h / 2) * 2
-                input_w = input_w - math.floor(kernel_h / 2) * 2
-            else:
-                input_idx = input_tensor.tensor_idx
-        else:
-            input_idx = input_tensor.tensor_idx
-        # clean the buffer
-        self.tmpPADIndice = None
-
         params = {
             # operator
             "op": op_code_str,
@@ -285,7 +260,7 @@ class TfliteConvertor(object):
             "stride_h": stride_h,
             "stride_w": stride_w,
             # tensor
-            "input_idx": input_idx,
+            "input_idx": input_tensor.tensor_idx,
             "output_idx": output_tensor.tensor_idx,
             "input_dim": 3,
             "output_dim": 3,
@@ -334,17 +309,17 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
-        _, input2_h, input2_w, input2_c = input2_tensor.tensor.ShapeAsNumpy()
-        _, output_h, output_w, output_c = output_tensor.tensor.ShapeAsNumpy()
+        _, input_h, input_w, input_c = input_tensor.shape
+        _, input2_h, input2_w, input2_c = input2_tensor.shape
+        _, output_h, output_w, output_c = output_tensor.shape
         assert input_h == input2_h == output_h, "tensor shpae not consistent"
         assert input_w == input2_w == output_w, "tensor shpae not consistent"
         assert input_c == input2_c == output_c, "tensor shpae not consistent"
 
         # tensor types
-        input_type = self._getTensorTypeStr(input_tensor.tensor.Type())
-        input_type2 = self._getTensorTypeStr(input2_tensor.tensor.Type())
-        output_type = self._getTensorTypeStr(output_tensor.tensor.Type())
+        input_type = self._getTensorTypeStr(input_tensor.type)
+        input_type2 = self._getTensorTypeStr(input2_tensor.type)
+        output_type = self._getTensorTypeStr(output_tensor.type)
         assert input_type == input_type2 == output_type, "tensor type not consistent"
 
         # quantized setting
@@ -423,12 +398,12 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
-        _, output_h, output_w, output_c = output_tensor.tensor.ShapeAsNumpy()
+        _, input_h, input_w, input_c = input_tensor.shape
+        _, output_h, output_w, output_c = output_tensor.shape
 
         # tensor types
-        input_type = self._getTensorTypeStr(input_tensor.tensor.Type())
-        output_type = self._getTensorTypeStr(output_tensor.tensor.Type())
+        input_type = self._getTensorTypeStr(input_tensor.type)
+        output_type = self._getTensorTypeStr(output_tensor.type)
         assert input_type == output_type, "tensor type not consistent"
 
         # pool parameters
@@ -471,8 +446,8 @@ class TfliteConvertor(object):
             "input_h": input_h,
             "input_w": input_w,
             "input_c": input_c,
-            "input_dim": input_tensor.tensor.ShapeAsNumpy().size,
-            "output_dim": output_tensor.tensor.ShapeAsNumpy().size,
+            "input_dim": input_tensor.shape.size,
+            "output_dim": output_tensor.shape.size,
             "output_h": output_h,
             "output_w": output_w,
             "output_c": output_c,
@@ -508,8 +483,8 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
-        _, output_h, output_w, output_c = output_tensor.tensor.ShapeAsNumpy()
+        _, input_h, input_w, input_c = input_tensor.shape
+        _, output_h, output_w, output_c = output_tensor.shape
 
         params = {
             # operator
@@ -548,8 +523,135 @@ class TfliteConvertor(object):
         assert len(output_tensors) == 1, "output tensors length should be 1"
         output_tensor = output_tensors[0]
 
-        # fuse pad into conv
-        self.tmpPADIndice = PAD_tensorIndice(input_tensor.tensor_idx, output_tensor.tensor_idx)
+        # paddings: (rank, 2) int32/int64 tensor without quantization parameters
+        paddings_idx = op.InputsAsNumpy()[1]
+        paddings_dtype = np.int64 if self.tensor_table.types[paddings_idx] == TensorType.INT64 else np.int32
+        paddings = np.frombuffer(self.tensor_table.getData(paddings_idx), dtype=paddings_dtype).reshape(-1, 2)
+        assert len(paddings) == 4 and not paddings[0].any() and not paddings[3].any(), "only pad h and w of NHWC"
+        pads = tuple(int(p) for p in paddings[1:3].reshape(-1))
+
+        # consecutive PADs add up
+        input_idx = self.aliases.get(input_tensor.tensor_idx, input_tensor.tensor_idx)
+        if input_idx in self.pads:
+            pads = tuple(p + q for p, q in zip(self.pads[input_idx].pads, pads))
+            input_idx = self.pads[input_idx].input_idx
+
+        # fused into the consumers after parsing, see _foldPads
+        self.pads[output_tensor.tensor_idx] = PAD_tensorIndice(input_idx, output_tensor.tensor_idx, pads)
+
+    def _convert_alias(self, op):
+        input_idx = int(op.InputsAsNumpy()[0])
+        output_idx = int(op.OutputsAsNumpy()[0])
+        self.aliases[output_idx] = self.aliases.get(input_idx, input_idx)
+
+    def _convert_quantize(self, op):
+        input_idx = int(op.InputsAsNumpy()[0])
+        output_idx = int(op.OutputsAsNumpy()[0])
+        input_idx = self.aliases.get(input_idx, input_idx)
+        if self._getOpCodeStr(op) == "DEQUANTIZE":
+            self.dequantized[output_idx] = input_idx
+            return
+
+        # QUANTIZE of int8 (or of a DEQUANTIZE of int8) to the same quantization parameters is an identity
+        source_idx = self.dequantized.get(input_idx, input_idx)
+        source = self.tensor_table.getWrapper(source_idx)
+        output = self.tensor_table.getWrapper(output_idx)
+        if source is None or output is None or source.type != TensorType.INT8 or output.type != TensorType.INT8:
+            return
+        if source.qnn_params is None or output.qnn_params is None:
+            return
+        if all(np.array_equal(source.qnn_params[k], output.qnn_params[k]) for k in ("scale", "zero_point")):
+            self.aliases[output_idx] = self.aliases.get(source_idx, source_idx)
+
+    # redirect the layers reading an alias to the tensor it aliases, which then lives until the last of them
+    def _resolveAliases(self):
+        for layer in self.layer:
+            for key in INPUT_KEYS:
+                idx = layer.params.get(key)
+                if idx not in self.aliases:
+                    continue
+                layer.params[key] = self.aliases[idx]
+                for t in layer.input_tensors:
+                    if t.graph_idx == str(idx):
+                        t.graph_idx = str(self.aliases[idx])
+
+    # redirect the layers reading a PAD to its input and let their kernels pad implicitly, otherwise keep the PAD as a
+    # layer right before its first consumer
+    def _foldPads(self):
+        layers = []
+        # (PAD output tensor index, kept pads) -> output tensor index of the kept PAD layer
+        kept = {}
+        for layer in self.layer:
+            params = layer.params
+            for k, (key, prefix) in enumerate(zip(INPUT_KEYS, concat.INPUT_PREFIXES)):
+                if params.get(key) not in self.pads:
+                    continue
+                padding = self.pads[params[key]]
+                pad_t, pad_b, pad_l, pad_r = padding.pads
+                if key == "input_idx" and (not any(padding.pads) or _isImplicitPadding(params, padding.pads)):
+                    input_idx = padding.input_idx
+                    params["input_h"] -= pad_t + pad_b
+                    params["input_w"] -= pad_l + pad_r
+                else:
+                    # the kernel of a VALID layer still pads on all sides, so the kept PAD leaves that part to it
+                    kernel_padding = _kernelPadding(params) if key == "input_idx" else 0
+                    pads = tuple(p - kernel_padding for p in padding.pads)
+                    if min(pads) < 0:
+                        raise NotImplementedError(
+                            f"PAD {padding.pads} before {params['op']} is not supported, its kernel pads "
+                            f"{kernel_padding} on all sides"
+                        )
+                    if (padding.output_idx, pads) not in kept:
+                        if kernel_padding == 0:
+                            output_idx = padding.output_idx
+                        else:
+                            # a smaller tensor than the PAD output, indexed after the tensors of the model
+                            output_idx = self.tensor_table.num_tensors + len(kept)
+                        kept[(padding.output_idx, pads)] = output_idx
+                        layers.append(self._convert_kept_PAD(padding, pads, output_idx))
+                    input_idx = kept[(padding.output_idx, pads)]
+                    params[f"{prefix}_h"] -= 2 * kernel_padding
+                    params[f"{prefix}_w"] -= 2 * kernel_padding
+                params[key] = input_idx
+                layer.input_tensors[k].graph_idx = str(input_idx)
+                layer.input_tensors[k].set_input_h(params[f"{prefix}_h"])
+                layer.input_tensors[k].set_input_w(params[f"{prefix}_w"])
+            layers.append(layer)
+        self.layer = layers
+
+    def _convert_kept_PAD(self, padding, pads, output_idx):
+        output_tensor = self.tensor_table.getWrapper(padding.output_idx)
+        _, padded_h, padded_w, output_c = output_tensor.shape
+        input_h = padded_h - padding.pads[0] - padding.pads[1]
+        input_w = padded_w - padding.pads[2] - padding.pads[3]
+        pad_t, pad_b, pad_l, pad_r = pads
+        dtype = self._getTensorTypeStr(output_tensor.type)
+        params = {
+            # operator
+            "op": "PAD",
+            "pad_t": pad_t,
+            "pad_b": pad_b,
+            "pad_l": pad_l,
+            "pad_r": pad_r,
+            # tensor
+            "input_idx": padding.input_idx,
+            "input_dim": 3,
+            "input_h": input_h,
+            "input_w": input_w,
+            "input_c": output_c,
+            "output_idx": output_idx,
+            "output_dim": 3,
+            "output_h": input_h + pad_t + pad_b,
+            "output_w": input_w + pad_l + pad_r,
+            "output_c": output_c,
+            "input_dtype": dtype,
+            "output_dtype": dtype,
+            # PAD keeps the quantization parameters, the padded value is the zero point
+            "input_zero_point": output_tensor.qnn_params["zero_point"],
+        }
+        op = pad.Pad(params)
+
+        return op
 
     def _convert_TRANSPOSE(self, op):
         # get input, weight, and output tensors
@@ -563,6 +665,57 @@ class TfliteConvertor(object):
         # fuse pad into conv
         self.skip_transpose = PAD_tensorIndice(input_tensor.tensor_idx, output_tensor.tensor_idx)
 
+    def _convert_CONCATENATION(self, op):
+        # get input, weight, and output tensors
+        input_tensors = self._get_input_tensors(op)
+        assert 2 <= len(input_tensors) <= len(concat.INPUT_PREFIXES), "input tensors length should be 2 or 3"
+
+        output_tensors = self._get_output_tensors(op)
+        assert len(output_tensors) == 1, "output tensors length should be 1"
+        output_tensor = output_tensors[0]
+
+        # concatenation options
+        assert op.BuiltinOptionsType() == BuiltinOptions.ConcatenationOptions
+        op_options = op.BuiltinOptions()
+        concat_options = ConcatenationOptions()
+        concat_options.Init(op_options.Bytes, op_options.Pos)
+
+        # tensors of lower rank are handled as NHWC with leading dimensions of 1
+        rank = len(output_tensor.shape)
+        axis = concat_options.Axis() % rank + 4 - rank
+        assert axis > 0, "concatenation along the batch is not supported"
+
+        # the inputs are copied as is
+        for input_tensor in input_tensors:
+            for k in ("scale", "zero_point"):
+                if not np.array_equal(input_tensor.qnn_params[k], output_tensor.qnn_params[k]):
+                    raise NotImplementedError("CONCATENATION with requantization is not supported")
+
+        _, output_h, output_w, output_c = [1] * (4 - rank) + list(output_tensor.shape)
+        params = {
+            # operator
+            "op": "CONCATENATION",
+            "axis": axis,
+            # tensor
+            "output_idx": output_tensor.tensor_idx,
+            "output_dim": 3,
+            "output_h": output_h,
+            "output_w": output_w,
+            "output_c": output_c,
+            "output_dtype": self._getTensorTypeStr(output_tensor.type),
+        }
+        for prefix, input_tensor in zip(concat.INPUT_PREFIXES, input_tensors):
+            _, input_h, input_w, input_c = [1] * (4 - rank) + list(input_tensor.shape)
+            params[f"{prefix}_idx"] = input_tensor.tensor_idx
+            params[f"{prefix}_dim"] = 3
+            params[f"{prefix}_h"] = input_h
+            params[f"{prefix}_w"] = input_w
+            params[f"{prefix}_c"] = input_c
+            params[f"{prefix}_dtype"] = self._getTensorTypeStr(input_tensor.type)
+        op = concat.Concat(params)
+
+        return op
+
     def _convert_maxpool(self, op):
         # Incase no params
         input_type = None
@@ -583,8 +736,8 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
-        _, output_h, output_w, output_c = output_tensor.tensor.ShapeAsNumpy()
+        _, input_h, input_w, input_c = input_tensor.shape
+        _, output_h, output_w, output_c = output_tensor.shape
 
         # pool parameters
         assert op.BuiltinOptionsType() == BuiltinOptions.Pool2DOptions
@@ -647,12 +800,12 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        input_shape = input_tensor.tensor.ShapeAsNumpy()
-        output_shape = output_tensor.tensor.ShapeAsNumpy()
+        input_shape = input_tensor.shape
+        output_shape = output_tensor.shape
 
         input_h, input_w, input_c = get_hwc_from_chwshape(input_shape)
         output_h, output_w, output_c = get_hwc_from_chwshape(output_shape)
-        input_type = self._getTensorTypeStr(input_tensor.tensor.Type())
+        input_type = self._getTensorTypeStr(input_tensor.type)
 
         if not MEAN2Dholder.has_first_1D:
             MEAN2Dholder.add_first_1D_op(input_tensor.tensor_idx, output_tensor.tensor_idx, input_h, input_w, input_c)
@@ -710,19 +863,19 @@ class TfliteConvertor(object):
         output_tensor = output_tensors[0]
 
         # shapes
-        if input_tensor.tensor.ShapeAsNumpy().shape[0] == 2:
-            input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
+        if input_tensor.shape.shape[0] == 2:
+            input_w, input_c = input_tensor.shape
             input_h = 1
-        elif input_tensor.tensor.ShapeAsNumpy().shape[0] == 4:
-            _, input_h, input_w, input_c = input_tensor.tensor.ShapeAsNumpy()
-        output_c, input_c_dual = weight_tensor.tensor.ShapeAsNumpy()
-        output_h, output_c_dual = output_tensor.tensor.ShapeAsNumpy()
+        elif input_tensor.shape.shape[0] == 4:
+            _, input_h, input_w, input_c = input_tensor.shape
+        output_c, input_c_dual = weight_tensor.shape
+        output_h, output_c_dual = output_tensor.shape
         assert input_c_dual == input_c, "channels not match"
         assert output_c_dual == output_c, "channels not match"
 
         # tensor types
-        input_type = self._getTensorTypeStr(input_tensor.tensor.Type())
-        output_type = self._getTensorTypeStr(output_tensor.tensor.Type())
+        input_type = self._getTensorTypeStr(input_tensor.type)
+        output_type = self._getTensorTypeStr(output_tensor.type)
         assert input_type == output_type, "tensor type not consistent"
 
         # quantized setting
@@ -794,6 +947,8 @@ class TfliteConvertor(object):
             self.layer.append(self._convert_upsample(op))
         elif op_code_str == "MAX_POOL_2D":
             self.layer.append(self._convert_maxpool(op))
+        elif op_code_str == "CONCATENATION":
+            self.layer.append(self._convert_CONCATENATION(op))
         elif op_code_str in "MEAN":
             ret_op = self._convert_mean1D(op, self.average_1D_to_2D_holder)
             if ret_op is not None:
@@ -806,23 +961,25 @@ class TfliteConvertor(object):
             self._convert_TRANSPOSE(op)
         elif op_code_str in "FULLY_CONNECTED":
             self.layer.append(self._convert_FULLY_CONNECTED(op))
-        elif op_code_str in SKIP_OPs:
-            pass
+        elif op_code_str in ALIAS_OPs:
+            self._convert_alias(op)
+        elif op_code_str in QUANTIZE_OPs:
+            self._convert_quantize(op)
         else:
             raise NotImplementedError(f"Unsupported {op_code_str}")
 
     def _get_np_from_wrapper(self, wrapper):
-        if wrapper.tensor.Type() == TensorType.INT8:
+        if wrapper.type == TensorType.INT8:
             dtype = np.int8
-        elif wrapper.tensor.Type() == TensorType.INT32:
+        elif wrapper.type == TensorType.INT32:
             dtype = np.int32
         else:
             raise NotImplementedError("Current implementation only supports int8 and int32")
 
-        data = wrapper.buffer.DataAsNumpy()
-        shape = wrapper.tensor.ShapeAsNumpy() if wrapper.tensor.ShapeLength() != 0 else []
+        # read-only view into the model buffer, no copy
+        data = self.tensor_table.getData(wrapper.tensor_idx)
 
-        return np.frombuffer(data, dtype=dtype).reshape(shape)
+        return np.frombuffer(data, dtype=dtype).reshape(wrapper.shape)
 
     def _get_tensor_type_str(self, tensor_type):
         if tensor_type == TensorType.INT8:
@@ -838,40 +995,19 @@ class TfliteConvertor(object):
     def _get_wrapper_tensors(self, tensor_index_list):
         ret = []
         for idx in tensor_index_list:
-            tensor = self.subgraph.Tensors(idx)
-            buffer_idx = tensor.Buffer()
-            buffer = self.model.Buffers(buffer_idx)
-
-            tflite_qparams = tensor.Quantization()
-
-            if tflite_qparams is None:
-                continue
-            assert tflite_qparams, "Quantization parameters not found in the model!"
-
-            scale = tflite_qparams.ScaleAsNumpy()
-            zero_point = tflite_qparams.ZeroPointAsNumpy()
-            qparams_to_tensor_wrapper = None
-
-            if isinstance(zero_point, np.ndarray):
-                # Per-channel quantization
-                if scale.size != 1 and zero_point.size != 1:
-                    qparams_to_tensor_wrapper = {"scale": scale, "zero_point": zero_point}
-                # Per-tensor quantization
-                elif scale.size == 1 and zero_point.size == 1:
-                    qparams_to_tensor_wrapper = {"scale": float(scale[0]), "zero_point": int(zero_point[0])}
-                else:
-                    raise NotImplementedError
-            elif scale == zero_point == 0:
-                pass
-
-            ret.append(TFLiteTensorWrpper(idx, tensor, buffer, qparams_to_tensor_wrapper))
+            wrapper = self.tensor_table.getWrapper(idx)
+            # tensors without quantization parameters are skipped
+            if wrapper is not None:
+                ret.append(wrapper)
         return ret
 
 
 class PAD_tensorIndice(object):
-    def __init__(self, input_idx, output_idx):
+    def __init__(self, input_idx, output_idx, pads=None):
         self.input_idx = input_idx
         self.output_idx = output_idx
+        # pad_t, pad_b, pad_l, pad_r
+        self.pads = pads
 
 
 class MEAN2D(object):
@@ -897,11 +1033,117 @@ class MEAN2D(object):
 
 
 class TFLiteTensorWrpper:
-    def __init__(self, tensor_idx, tensor, buffer, qnn_params):
+    def __init__(self, tensor_idx, table):
         self.tensor_idx = tensor_idx
-        self.tensor = tensor
-        self.buffer = buffer
-        self.qnn_params = qnn_params
+        self.table = table
+        self.shape = table.getShape(tensor_idx)
+        self.type = int(table.types[tensor_idx])
+        self.qnn_params = table.qnn_params[tensor_idx]
+
+    @property
+    def tensor(self):
+        return self.table.subgraph.Tensors(self.tensor_idx)
+
+    @property
+    def buffer(self):
+        return self.table.model.Buffers(int(self.table.buffer_idx[self.tensor_idx]))
+
+
+# Shapes, types and quantization parameters of all tensors in a subgraph, decoded in one pass at load time
+class TFLiteTensorTable(object):
+    def __init__(self, model, subgraph):
+        self.model = model
+        self.subgraph = subgraph
+        num_tensors = subgraph.TensorsLength()
+        self.num_tensors = num_tensors
+        shapes = []
+        self.types = np.zeros(num_tensors, dtype=np.int8)
+        self.buffer_idx = np.zeros(num_tensors, dtype=np.int32)
+        self.ranks = np.zeros(num_tensors, dtype=np.int8)
+        self.has_qnn_params = np.zeros(num_tensors, dtype=bool)
+        self.qnn_params = [None] * num_tensors
+        for idx in range(num_tensors):
+            tensor = subgraph.Tensors(idx)
+            shape = tensor.ShapeAsNumpy() if tensor.ShapeLength() != 0 else np.zeros(0, dtype=np.int32)
+            shapes.append(shape)
+            self.types[idx] = tensor.Type()
+            self.buffer_idx[idx] = tensor.Buffer()
+            self.ranks[idx] = len(shape)
+
+            tflite_qparams = tensor.Quantization()
+            if tflite_qparams is None:
+                continue
+            self.has_qnn_params[idx] = True
+            self.qnn_params[idx] = _get_qnn_params(tflite_qparams)
+
+        # padded (num_tensors, max_rank) table, the valid part of each row is [:rank]
+        self.shapes = np.zeros((num_tensors, max(self.ranks, default=0)), dtype=np.int32)
+        for idx, shape in enumerate(shapes):
+            self.shapes[idx, : len(shape)] = shape
+
+        # buffers and wrappers are created lazily on the first access
+        self._data = {}
+        self._wrappers = [None] * num_tensors
+
+    def getShape(self, idx):
+        return self.shapes[idx, : self.ranks[idx]]
+
+    def getData(self, idx):
+        buffer_idx = int(self.buffer_idx[idx])
+        if buffer_idx not in self._data:
+            self._data[buffer_idx] = self.model.Buffers(buffer_idx).DataAsNumpy()
+        return self._data[buffer_idx]
+
+    def getWrapper(self, idx):
+        # optional tensors are indicated by -1
+        if idx < 0 or not self.has_qnn_params[idx]:
+            return None
+        if self._wrappers[idx] is None:
+            self._wrappers[idx] = TFLiteTensorWrpper(idx, self)
+        return self._wrappers[idx]
+
+
+def _get_qnn_params(tflite_qparams):
+    scale = tflite_qparams.ScaleAsNumpy()
+    zero_point = tflite_qparams.ZeroPointAsNumpy()
+    qparams_to_tensor_wrapper = None
+
+    if isinstance(zero_point, np.ndarray):
+        # Per-channel quantization
+        if scale.size != 1 and zero_point.size != 1:
+            qparams_to_tensor_wrapper = {"scale": scale, "zero_point": zero_point}
+        # Per-tensor quantization
+        elif scale.size == 1 and zero_point.size == 1:
+            qparams_to_tensor_wrapper = {"scale": float(scale[0]), "zero_point": int(zero_point[0])}
+        else:
+            raise NotImplementedError
+    elif scale == zero_point == 0:
+        pass
+
+    return qparams_to_tensor_wrapper
+
+
+# conv and depthwise kernels pad kernel // 2 on all sides with the input zero point, the same value as PAD
+def _isImplicitPadding(params, pads):
+    if params["op"] not in ("CONV_2D", "DEPTHWISE_CONV_2D") or params["kernel_h"] != params["kernel_w"]:
+        return False
+    # the layer has to be VALID on the padded input, otherwise it pads a second time
+    if not _isValid(params):
+        return False
+    return all(p == params["padding"] for p in pads)
+
+
+# the padding that the kernel of a layer VALID on its input adds anyway, which a PAD before it has to cover
+def _kernelPadding(params):
+    if params["op"] not in ("CONV_2D", "DEPTHWISE_CONV_2D") or not _isValid(params):
+        return 0
+    return params["padding"]
+
+
+def _isValid(params):
+    valid_h = (params["input_h"] - params["kernel_h"]) // params["stride_h"] + 1
+    valid_w = (params["input_w"] - params["kernel_w"]) // params["stride_w"] + 1
+    return (valid_h, valid_w) == (params["output_h"], params["output_w"])
 
 
 def get_hwc_from_chwshape(shape):
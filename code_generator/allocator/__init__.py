@@ -1 +1 @@
-__all__ = ["base_allocator", "firstFit"]
+__all__ = ["base_allocator", "bestFit", "branchBound", "firstFit", "strategy"]
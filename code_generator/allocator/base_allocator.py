@@ -16,19 +16,71 @@
 # Target ISA:  ARMv7E-M
 # ----------------------------------------------------------------------
 
-import matplotlib
-import matplotlib.pyplot as plt
+import heapq
+import json
+import multiprocessing
+
 import numpy
-from matplotlib.ticker import MaxNLocator
-from tqdm import tqdm
 
-from code_generator.constant import FIGURE_CONFIG, TTYPE_INFERNECE
+from code_generator.constant import FIGURE_CONFIG, TTYPE_INFERNECE, TTYPE_SCRATCH
+
+from .placement_index import PlacementIndex
+
+
+class Rectangle:
+    """A tensor to schedule: its life cycle [start, end), size and placement in bytes.
+
+    The footprint of a tensor may shrink during its life cycle, e.g., after an inplace strided depthwise conv or
+    pooling only the smaller output is kept at the start of the buffer. Fields can also be accessed by key
+    (rec["placement"]) as with the former dict records.
+    """
+
+    __slots__ = ("start", "end", "size", "placement", "name", "type", "idx", "shrinks")
+
+    def __init__(self, start, end, size, placement, name, type, idx):
+        self.start = start
+        self.end = end
+        self.size = size
+        self.placement = placement
+        self.name = name
+        self.type = type
+        self.idx = idx
+        # (layer, size) sorted by layer: only size bytes are needed from the layer on
+        self.shrinks = []
+
+    def shrink(self, layer, size):
+        """Only keep the first size bytes of the tensor from the layer on."""
+        if self.start < layer < self.end and size < self.sizeAt(layer):
+            self.shrinks = sorted([(t, s) for t, s in self.shrinks if t != layer] + [(layer, size)])
+
+    def sizeAt(self, layer):
+        size = self.size
+        for t, s in self.shrinks:
+            if t <= layer:
+                size = s
+        return size
+
+    def segments(self):
+        """Return the (start, end, size) of each part of the life cycle with a constant footprint."""
+        bounds = [self.start] + [t for t, _ in self.shrinks] + [self.end]
+        sizes = [self.size] + [s for _, s in self.shrinks]
+        return [(bounds[k], bounds[k + 1], sizes[k]) for k in range(len(sizes))]
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
 
 
 class BaseAllocator:
     def __init__(self, SRAM):
         self.rectangles = []
         self.SRAM = SRAM
+        # rectangle idx -> rectangle, the order of self.rectangles changes when sorting
+        self.rectangle_by_idx = {}
+        # placed rectangles, built during allocate()
+        self.placement_index = PlacementIndex()
 
     # Description: add a tensor to schedule, return the index of the rectangle
     # Note: placement -1 indicates no placed yet
@@ -40,204 +92,197 @@ class BaseAllocator:
         placement=-1,
         name=None,
         type="activation",
-        stride2_inplace_idx=None,
     ) -> int:
         tensor_idx = len(self.rectangles)
-        self.rectangles.append(
-            {
-                "start": start,
-                "end": end,
-                "size": size,
-                "placement": placement,
-                "name": name,
-                "type": type,
-                "idx": tensor_idx,
-                "stride2_inplace_idx": stride2_inplace_idx,
-            }  # if this is set, we only need 1/4 of it after
-        )
+        rec = Rectangle(start, end, size, placement, name, type, tensor_idx)
+        self.rectangles.append(rec)
+        self.rectangle_by_idx[tensor_idx] = rec
         return tensor_idx
 
     def getIdxAddress(self, idx):
-        target_rec = None
-        for rec in self.rectangles:
-            if rec["idx"] == idx:
-                target_rec = rec
-        assert target_rec is not None
-        return target_rec["placement"]
+        assert idx in self.rectangle_by_idx
+        return self.rectangle_by_idx[idx].placement
+
+    def columns(self):
+        """Return the rectangles as int64 arrays of start, end, size and placement, in the order of self.rectangles."""
+        recs = self.rectangles
+        return (
+            numpy.fromiter((rec.start for rec in recs), dtype=numpy.int64, count=len(recs)),
+            numpy.fromiter((rec.end for rec in recs), dtype=numpy.int64, count=len(recs)),
+            numpy.fromiter((rec.size for rec in recs), dtype=numpy.int64, count=len(recs)),
+            numpy.fromiter((rec.placement for rec in recs), dtype=numpy.int64, count=len(recs)),
+        )
 
     def allocate(self):
         # place each rectangle
-        print(f"Deriving the memory schedule for {len(self.rectangles)} activation tensors.")
-        for cnt, rec in enumerate(tqdm(self.rectangles)):
+        self.placement_index = PlacementIndex(max(len(self.rectangles), 1))
+        for cnt, rec in enumerate(self.rectangles):
             # fit each tensor into the memmory
-            rec["placement"] = self.fit(rec)
+            rec.placement = self.fit(rec)
+            self.placement_index.add(rec.placement, rec.segments())
 
     def fit(self, rec) -> int:  # memory address
         raise NotImplementedError
 
     def sortSize(self):
+        # largest first, rectangles of the same size keep their order
+        assert all(rec.size > 0 for rec in self.rectangles)
+        heap = [(-rec.size, cnt, rec) for cnt, rec in enumerate(self.rectangles)]
+        heapq.heapify(heap)
+        self.rectangles = [heapq.heappop(heap)[2] for _ in range(len(heap))]
+
+    def sortBreadth(self):
+        # greedy by breadth: go through the layers from the largest total size of live tensors,
+        # and place the tensors live at each layer largest first
+        start, end, size, _ = self.columns()
+        num_layers = int(end.max()) if len(self.rectangles) > 0 else 0
+        breadth = numpy.zeros(num_layers + 1, dtype=numpy.int64)
+        numpy.add.at(breadth, start, size)
+        numpy.add.at(breadth, end, -size)
+        breadth = numpy.cumsum(breadth)[:num_layers]
         sort_rectangles = []
-        while len(self.rectangles) > 0:
-            max_size = 0
-            max_rectangle = None
-            for rec in self.rectangles:
-                if rec["size"] > max_size:
-                    max_size = rec["size"]
-                    max_rectangle = rec
-            assert max_rectangle is not None
-            sort_rectangles.append(max_rectangle)
-            self.rectangles.remove(max_rectangle)
+        added = numpy.zeros(len(self.rectangles), dtype=bool)
+        for layer in numpy.argsort(-breadth, kind="stable"):
+            live = numpy.flatnonzero((start <= layer) & (layer < end) & ~added)
+            live = live[numpy.argsort(-size[live], kind="stable")]
+            added[live] = True
+            sort_rectangles += [self.rectangles[i] for i in live]
         self.rectangles = sort_rectangles
 
+    def sortConflict(self):
+        # largest total size of tensors with overlapping life cycles first, then largest size first
+        start, end, size, _ = self.columns()
+        assert (start < end).all()
+        # a sweep over the sorted life cycles: all tensors except the ones starting at or after the end, or ending at
+        # or before the start of each tensor, which are disjoint
+        start_order = numpy.argsort(start, kind="stable")
+        end_order = numpy.argsort(end, kind="stable")
+        size_by_start = numpy.concatenate(([0], numpy.cumsum(size[start_order])))
+        size_by_end = numpy.concatenate(([0], numpy.cumsum(size[end_order])))
+        starting_before_end = size_by_start[numpy.searchsorted(start[start_order], end, side="left")]
+        ending_before_start = size_by_end[numpy.searchsorted(end[end_order], start, side="right")]
+        conflict = starting_before_end - ending_before_start
+        order = numpy.lexsort((-size, -conflict))
+        self.rectangles = [self.rectangles[i] for i in order]
+
     def get_peak(self):
-        peak = 0
-        for rec in self.rectangles:
-            rec_size = rec["placement"] + rec["size"]
-            if peak < rec_size:
-                peak = rec_size
-        return peak
-
-    def visualize(self, path, scale=1024):
-        fig = plt.figure()
-        ax = fig.add_subplot(111)
-        max_y = max_x = 0
-
-        for rec in self.rectangles:
-            start, end, placement, size = (
-                rec["start"],
-                rec["end"],
-                rec["placement"],
-                rec["size"],
-            )
-            if max_y < rec["placement"] / scale + size / scale:
-                max_y = rec["placement"] / scale + size / scale
-            if max_x < end:
-                max_x = end
-
-        # x ticks
-        max_x = max_x + (10 - max_x % 10)
-        max_y = max_y + (10000 / scale - max_y % 10000 / scale)
-        # x_ticks = numpy.arange(0, max_x + 1, step=max(1, int(max_x / 10)))
-        x_ticks = numpy.arange(0, FIGURE_CONFIG["X_MAX"] + 1, step=FIGURE_CONFIG["X_STEP"])
-        plt.xticks(x_ticks, fontsize=FIGURE_CONFIG["FONT_SIZE"])
-        # y ticks
-        y_ticks = numpy.arange(0, FIGURE_CONFIG["Y_MAX"] + 1, step=FIGURE_CONFIG["Y_STEP"])
-        plt.yticks(y_ticks, fontsize=FIGURE_CONFIG["FONT_SIZE"])
-        plt.xlim([0, FIGURE_CONFIG["X_MAX"]])
-        plt.ylim([0, FIGURE_CONFIG["Y_MAX"]])
-        plt.xlabel("Life cycle (operator)")
-        plt.ylabel("Memory Footprint (KB)")
-        plt.subplots_adjust(bottom=0.15)
-        figure = plt.gcf()
-        ax.title.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
-        ax.xaxis.label.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
-        ax.yaxis.label.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
-        figure.set_size_inches(FIGURE_CONFIG["FIGURE_W_INCH"], FIGURE_CONFIG["FIGURE_H_INCH"])
-        ax.set_axisbelow(True)
-        ax.yaxis.grid(color="gray", linestyle="dashed")
-        ax.xaxis.grid(color="gray", linestyle="dashed")
-        ax.patch.set_edgecolor("black")
-        ax.patch.set_linewidth("2")
+        if len(self.rectangles) == 0:
+            return 0
+        _, _, size, placement = self.columns()
+        return max(int((placement + size).max()), 0)
 
-        for cnt, rec in enumerate(self.rectangles):
-            start, end, placement, size = (
-                rec["start"],
-                rec["end"],
-                rec["placement"],
-                rec["size"],
-            )
-            hatch = None
-            if rec["type"] == TTYPE_INFERNECE:
-                color = FIGURE_CONFIG["INFERENCE_COLOR"]
-            else:
-                raise NotImplementedError
-            if rec["stride2_inplace_idx"]:
-                # Draw the first one
-                rect = matplotlib.patches.Rectangle(
-                    (start, placement / scale),
-                    rec["stride2_inplace_idx"] - start,
-                    size / scale,
-                    color=color,
-                    hatch=hatch,
-                )
+    def export(self):
+        """Return the placement of all rectangles as plain data, e.g., to dump as JSON or to render later."""
+        return {
+            "peak": self.get_peak(),
+            "rectangles": [
+                {
+                    "idx": rec.idx,
+                    "name": str(rec.name),
+                    "type": rec.type,
+                    "start": rec.start,
+                    "end": rec.end,
+                    "size": rec.size,
+                    "placement": rec.placement,
+                    "segments": rec.segments(),
+                }
+                for rec in sorted(self.rectangles, key=lambda r: r.idx)
+            ],
+        }
 
-                rect.set_edgecolor("black")
-                ax.add_patch(rect)
-                ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-
-                # Annotate index
-                if FIGURE_CONFIG["SHOW_INDEX"]:
-                    cx = (start + rec["stride2_inplace_idx"]) / 2
-                    cy = (placement / scale) + (size / scale) / 2
-                    ax.annotate(
-                        str(rec["idx"]),
-                        (cx, cy),
-                        color="b",
-                        fontsize=_get_index_font_size(
-                            FIGURE_CONFIG["INDEX_FONT_SIZE"], (size / scale), FIGURE_CONFIG["Y_STEP"]
-                        ),
-                        weight="bold",
-                        ha="center",
-                        va="center",
-                    )
-
-                # Draw the 1/4 one
-                rect = matplotlib.patches.Rectangle(
-                    (rec["stride2_inplace_idx"], placement / scale),
-                    end - rec["stride2_inplace_idx"],
-                    int(size / scale / 4),
-                    color=color,
-                    hatch=hatch,
-                )
+    def visualize(self, path, scale=1024, background=False):
+        """Dump the placement to path, see dumpPlacement."""
+        return dumpPlacement(self.export(), path, scale, background)
+
+
+def dumpPlacement(data, path, scale=1024, background=False):
+    """Dump the placement exported by BaseAllocator.export to path.
+
+    A .json path gets the data as is, other paths get a figure rendered with matplotlib. With background set, the
+    figure is rendered in a forked process, which is returned.
+    """
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+        return None
+    if background and "fork" in multiprocessing.get_all_start_methods():
+        process = multiprocessing.get_context("fork").Process(target=renderPlacement, args=(data, path, scale))
+        process.start()
+        return process
+    renderPlacement(data, path, scale)
+    return None
+
+
+def renderPlacement(data, path, scale=1024):
+    """Render the placement exported by BaseAllocator.export to an image."""
+    # matplotlib is slow to import and only needed for the figure
+    import matplotlib.patches
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+
+    # x ticks
+    x_ticks = numpy.arange(0, FIGURE_CONFIG["X_MAX"] + 1, step=FIGURE_CONFIG["X_STEP"])
+    plt.xticks(x_ticks, fontsize=FIGURE_CONFIG["FONT_SIZE"])
+    # y ticks
+    y_ticks = numpy.arange(0, FIGURE_CONFIG["Y_MAX"] + 1, step=FIGURE_CONFIG["Y_STEP"])
+    plt.yticks(y_ticks, fontsize=FIGURE_CONFIG["FONT_SIZE"])
+    plt.xlim([0, FIGURE_CONFIG["X_MAX"]])
+    plt.ylim([0, FIGURE_CONFIG["Y_MAX"]])
+    plt.xlabel("Life cycle (operator)")
+    plt.ylabel("Memory Footprint (KB)")
+    plt.subplots_adjust(bottom=0.15)
+    ax.title.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
+    ax.xaxis.label.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
+    ax.yaxis.label.set_fontsize(FIGURE_CONFIG["FONT_SIZE"])
+    fig.set_size_inches(FIGURE_CONFIG["FIGURE_W_INCH"], FIGURE_CONFIG["FIGURE_H_INCH"])
+    ax.set_axisbelow(True)
+    ax.yaxis.grid(color="gray", linestyle="dashed")
+    ax.xaxis.grid(color="gray", linestyle="dashed")
+    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+    ax.patch.set_edgecolor("black")
+    ax.patch.set_linewidth("2")
+
+    for rec in data["rectangles"]:
+        placement, size = rec["placement"], rec["size"]
+        hatch = None
+        if rec["type"] == TTYPE_INFERNECE:
+            color = FIGURE_CONFIG["INFERENCE_COLOR"]
+        elif rec["type"] == TTYPE_SCRATCH:
+            color = FIGURE_CONFIG["SCRATCH_COLOR"]
+        else:
+            raise NotImplementedError
+        for seg_start, seg_end, seg_size in rec["segments"]:
+            rect = matplotlib.patches.Rectangle(
+                (seg_start, placement / scale),
+                seg_end - seg_start,
+                seg_size / scale,
+                color=color,
+                hatch=hatch,
+            )
 
-                rect.set_edgecolor("black")
-                ax.add_patch(rect)
-                ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-
-                # Annotate index
-                if FIGURE_CONFIG["SHOW_INDEX"]:
-                    cx = (rec["stride2_inplace_idx"] + end) / 2
-                    cy = (placement / scale) + (size / scale / 4) / 2
-                    ax.annotate(
-                        str(rec["idx"]),
-                        (cx, cy),
-                        color="b",
-                        fontsize=_get_index_font_size(
-                            FIGURE_CONFIG["INDEX_FONT_SIZE"], (size / scale), FIGURE_CONFIG["Y_STEP"]
-                        ),
-                        weight="bold",
-                        ha="center",
-                        va="center",
-                    )
-            else:
-                rect = matplotlib.patches.Rectangle(
-                    (start, placement / scale),
-                    end - start,
-                    size / scale,
-                    color=color,
-                    hatch=hatch,
+            rect.set_edgecolor("black")
+            ax.add_patch(rect)
+            # Annotate index
+            if FIGURE_CONFIG["SHOW_INDEX"]:
+                cx = (seg_start + seg_end) / 2
+                cy = (placement / scale) + (seg_size / scale) / 2
+                ax.annotate(
+                    str(rec["idx"]),
+                    (cx, cy),
+                    color="b",
+                    fontsize=_get_index_font_size(
+                        FIGURE_CONFIG["INDEX_FONT_SIZE"], (size / scale), FIGURE_CONFIG["Y_STEP"]
+                    ),
+                    weight="bold",
+                    ha="center",
+                    va="center",
                 )
 
-                rect.set_edgecolor("black")
-                ax.add_patch(rect)
-                ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-                # Annotate index
-                if FIGURE_CONFIG["SHOW_INDEX"]:
-                    cx = (start + end) / 2
-                    cy = (placement / scale) + (size / scale) / 2
-                    ax.annotate(
-                        str(rec["idx"]),
-                        (cx, cy),
-                        color="b",
-                        fontsize=_get_index_font_size(
-                            FIGURE_CONFIG["INDEX_FONT_SIZE"], (size / scale), FIGURE_CONFIG["Y_STEP"]
-                        ),
-                        weight="bold",
-                        ha="center",
-                        va="center",
-                    )
-
-        plt.savefig(path, dpi=FIGURE_CONFIG["DPI"])
+    plt.savefig(path, dpi=FIGURE_CONFIG["DPI"])
+    plt.close(fig)
 
 
 def _get_index_font_size(origin_font_size, y_size, y_block_size):
@@ -0,0 +1,38 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   bestFit.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import numpy as np
+
+from .base_allocator import BaseAllocator
+
+__all__ = ["BestFit"]
+
+
+class BestFit(BaseAllocator):
+    def fit(self, rec) -> int:
+        # free address ranges left by the placed rectangles overlapping with the insert block
+        gap_start, gap_end = self.placement_index.gaps(rec.start, rec.end, self.SRAM)
+        gap_size = gap_end - gap_start
+
+        # use the smallest available, the one on top of all placed rectangles only if nothing else fits
+        available = np.flatnonzero(gap_size >= rec.size)
+        assert len(available) > 0, "no available slot, memory exceed MAX SRAM setting"
+        bounded = available[gap_end[available] < self.SRAM]
+        if len(bounded) > 0:
+            available = bounded
+        return int(gap_start[available[np.argmin(gap_size[available])]])
@@ -0,0 +1,132 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   branchBound.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+from .placement_index import PlacementIndex
+
+__all__ = ["getLowerBound", "searchPlacement"]
+
+
+def getLowerBound(allocator):
+    """Return the largest total size of tensors alive at the same time, no placement can have a lower peak."""
+    recs = allocator.rectangles
+    if len(recs) == 0:
+        return 0
+    num_layers = max(rec.end for rec in recs)
+    live = np.zeros(num_layers + 1, dtype=np.int64)
+    for rec in recs:
+        for start, end, size in rec.segments():
+            live[start] += size
+            live[end] -= size
+    return int(np.cumsum(live).max())
+
+
+def searchPlacement(allocator, time_budget):
+    """Branch-and-bound search for a placement with a lower peak than the one of the placed allocator.
+
+    Each branch chooses the next rectangle to place at its lowest available address. A branch is cut when the
+    rectangles left cannot all be placed below the best peak found so far, since their lowest available addresses only
+    go up as more rectangles are placed. The search stops after time_budget seconds or when the best peak reaches the
+    lower bound.
+
+    Return the lower bound of the peak memory. The placements of allocator are updated if a better one is found.
+    """
+    lower_bound = getLowerBound(allocator)
+    best_peak = allocator.get_peak()
+    deadline = time.monotonic() + time_budget
+    recs = sorted(allocator.rectangles, key=lambda r: r.idx)
+    num = len(recs)
+    if best_peak <= lower_bound or num == 0:
+        return lower_bound
+
+    index = PlacementIndex(num)
+    placement = [-1] * num
+    best_placement = None
+    remaining = np.ones(num, dtype=bool)
+    # each frame: the children to try (rectangle, address) in order, the next child, the peak before placing it
+    stack = [[None, 0, 0]]
+    while len(stack) > 0 and time.monotonic() < deadline:
+        frame = stack[-1]
+        if frame[0] is None:
+            children, bound = _expand(recs, index, remaining, allocator.SRAM)
+            if not remaining.any():
+                if frame[2] < best_peak:
+                    best_peak = frame[2]
+                    best_placement = list(placement)
+                    if best_peak <= lower_bound:
+                        break
+            if len(children) == 0 or max(frame[2], bound) >= best_peak:
+                stack.pop()
+                _undo(stack, recs, index, placement, remaining)
+                continue
+            frame[0] = children
+        if frame[1] == len(frame[0]):
+            stack.pop()
+            _undo(stack, recs, index, placement, remaining)
+            continue
+        i, address = frame[0][frame[1]]
+        frame[1] += 1
+        rec = recs[i]
+        peak = max(frame[2], address + rec.size)
+        if peak >= best_peak:
+            continue
+        index.add(address, rec.segments())
+        placement[i] = address
+        remaining[i] = False
+        stack.append([None, 0, peak])
+
+    if best_placement is not None:
+        for rec in recs:
+            rec.placement = best_placement[rec.idx]
+    return lower_bound
+
+
+def _expand(recs, index, remaining, SRAM):
+    # lowest available address of each rectangle left, and the peak of placing all of them there
+    children = []
+    seen = set()
+    bound = 0
+    for i in np.flatnonzero(remaining):
+        rec = recs[i]
+        address = index.lowestFit(rec.segments(), SRAM)
+        if address is None:
+            # exceed the memory limit
+            return [], SRAM
+        bound = max(bound, address + rec.size)
+        # rectangles of the same shape at the same address lead to the same placements
+        key = (rec.start, rec.end, rec.size, tuple(rec.shrinks), address)
+        if key not in seen:
+            seen.add(key)
+            children.append((int(i), address))
+    # lowest address first, then largest first
+    children.sort(key=lambda c: (c[1], -recs[c[0]].size))
+    return children, bound
+
+
+def _undo(stack, recs, index, placement, remaining):
+    # remove the rectangle placed by the parent frame to get to the popped one
+    if len(stack) == 0:
+        return
+    parent = stack[-1]
+    i, _ = parent[0][parent[1] - 1]
+    index.pop()
+    placement[i] = -1
+    remaining[i] = True
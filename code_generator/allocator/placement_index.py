@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   placement_index.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import numpy as np
+
+__all__ = ["PlacementIndex"]
+
+ALIGNMENT = 4
+
+
+class PlacementIndex:
+    """Index of placed rectangles over time x address.
+
+    Each part of the life cycle of a rectangle with a constant footprint is stored as a row, column-wise, so that the
+    address ranges occupied during a time span, and the free ones left, are found with a few vectorized operations
+    instead of a loop over all placed rectangles.
+    """
+
+    def __init__(self, capacity=16):
+        self.num = 0
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.end = np.zeros(capacity, dtype=np.int64)
+        self.y0 = np.zeros(capacity, dtype=np.int64)
+        self.y1 = np.zeros(capacity, dtype=np.int64)
+        # number of rows of each added rectangle
+        self.rows = []
+
+    def add(self, placement, segments):
+        """Add a rectangle placed at placement with the (start, end, size) segments of its footprint."""
+        while self.num + len(segments) > len(self.start):
+            for col in ("start", "end", "y0", "y1"):
+                setattr(self, col, np.resize(getattr(self, col), 2 * len(self.start)))
+        for start, end, size in segments:
+            i = self.num
+            self.start[i], self.end[i] = start, end
+            self.y0[i], self.y1[i] = placement, placement + size
+            self.num += 1
+        self.rows.append(len(segments))
+
+    def pop(self):
+        """Remove the last added rectangle."""
+        assert len(self.rows) > 0
+        self.num -= self.rows.pop()
+
+    def occupied(self, start, end):
+        """Return the address ranges (y0, y1) occupied during [start, end), sorted by y0."""
+        n = self.num
+        alive = (self.start[:n] < end) & (start < self.end[:n])
+        y0 = self.y0[:n][alive]
+        y1 = self.y1[:n][alive]
+        order = np.argsort(y0, kind="stable")
+        return y0[order], y1[order]
+
+    def gaps(self, start, end, limit):
+        """Return the free address ranges (gap_start, gap_end) below limit during [start, end), in address order."""
+        y0, y1 = self.occupied(start, end)
+        # the free range before each occupied range starts at the highest address occupied by the ranges below it,
+        # aligned to 4 bytes for the 16/32-bit accesses of the kernels
+        reached = np.maximum.accumulate(np.concatenate(([0], y1)))
+        gap_start = _align(reached)
+        gap_end = np.minimum(np.concatenate((y0, [limit])), limit)
+        free = gap_end > gap_start
+        return gap_start[free], gap_end[free]
+
+    def lowestFit(self, segments, limit):
+        """Return the lowest address to place a rectangle with the (start, end, size) segments, None if not found."""
+        lo = []
+        hi = []
+        for start, end, size in segments:
+            # addresses in [y0 - size + 1, y1) overlap with an occupied range (y0, y1) in this segment
+            y0, y1 = self.occupied(start, end)
+            lo.append(y0 - size + 1)
+            hi.append(y1)
+        lo = np.concatenate(lo)
+        hi = np.concatenate(hi)
+        order = np.argsort(lo, kind="stable")
+        lo, hi = lo[order], hi[order]
+        # the lowest address above the ranges before each one
+        reached = _align(np.maximum.accumulate(np.concatenate(([0], hi))))
+        free = np.flatnonzero(lo > reached[:-1])
+        address = int(reached[free[0]]) if len(free) > 0 else int(reached[-1])
+        if address + max(size for _, _, size in segments) > limit:
+            return None
+        return address
+
+
+def _align(address):
+    return (address + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,84 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   strategy.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+from tqdm import tqdm
+
+from .bestFit import BestFit
+from .firstFit import FirstFit
+
+__all__ = ["ALLOCATION_STRATEGIES", "registerStrategy", "allocateBest"]
+
+# name -> (allocator class, name of the method ordering the rectangles before placement)
+ALLOCATION_STRATEGIES = {}
+
+
+def registerStrategy(name, allocator_cls, order):
+    ALLOCATION_STRATEGIES[name] = (allocator_cls, order)
+
+
+# the first one is the default and is kept when others do not lower the peak
+registerStrategy("first_fit_by_size", FirstFit, "sortSize")
+registerStrategy("best_fit_by_size", BestFit, "sortSize")
+registerStrategy("first_fit_by_breadth", FirstFit, "sortBreadth")
+registerStrategy("best_fit_by_breadth", BestFit, "sortBreadth")
+registerStrategy("first_fit_by_conflict", FirstFit, "sortConflict")
+registerStrategy("best_fit_by_conflict", BestFit, "sortConflict")
+
+
+def allocateBest(allocator, strategies=None):
+    """Place the rectangles of allocator with each strategy, return the allocator with the lowest peak.
+
+    strategies: names of the strategies to try, all registered strategies by default
+    """
+    if strategies is None:
+        strategies = list(ALLOCATION_STRATEGIES.keys())
+    assert len(strategies) > 0, "no allocation strategy"
+    for name in strategies:
+        if name not in ALLOCATION_STRATEGIES:
+            raise ValueError(f"unknown allocation strategy {name}, registered: {', '.join(ALLOCATION_STRATEGIES)}")
+    best = None
+    best_name = None
+    error = None
+    print(f"Deriving the memory schedule for {len(allocator.rectangles)} activation tensors.")
+    for name in tqdm(strategies):
+        allocator_cls, order = ALLOCATION_STRATEGIES[name]
+        candidate = _copyTensors(allocator, allocator_cls)
+        getattr(candidate, order)()
+        try:
+            candidate.allocate()
+        except AssertionError as e:
+            # exceed the memory limit with this strategy
+            error = e
+            continue
+        if best is None or candidate.get_peak() < best.get_peak():
+            best = candidate
+            best_name = name
+    if best is None:
+        raise error
+    if len(strategies) > 1:
+        print(f"Use allocation strategy {best_name}, peak memory: {best.get_peak()} bytes.")
+    return best
+
+
+def _copyTensors(allocator, allocator_cls):
+    # rectangles are added in their index order so that the index of each one is kept
+    new_allocator = allocator_cls(allocator.SRAM)
+    for rec in sorted(allocator.rectangles, key=lambda r: r.idx):
+        idx = new_allocator.addTensor(rec.start, rec.end, rec.size, name=rec.name, type=rec.type)
+        new_allocator.rectangle_by_idx[idx].shrinks = list(rec.shrinks)
+    return new_allocator
@@ -17,9 +17,11 @@
 # ----------------------------------------------------------------------
 
 TTYPE_INFERNECE = "inference"
+TTYPE_SCRATCH = "scratch"
 
 FIGURE_CONFIG = {
     "INFERENCE_COLOR": "#eab11f",  # yellow
+    "SCRATCH_COLOR": "#7fb3d5",  # blue
     "FIGURE_W_INCH": 19,
     "FIGURE_H_INCH": 7,
     "DPI": 800,
@@ -40,4 +42,7 @@ op_name_translation = {
     "ResizeNearestNeighbor": "UPSAMPLE",
 }
 
-SKIP_OPs = {"QUANTIZE", "DEQUANTIZE", "RESHAPE"}  # TODO: Handle RESHAPE during codegen
+# ops keeping the bytes of their input, their outputs are aliases of the inputs without any code
+ALIAS_OPs = {"RESHAPE", "SQUEEZE", "EXPAND_DIMS"}
+# skipped for int8 models, unless an identity which is aliased as well
+QUANTIZE_OPs = {"QUANTIZE", "DEQUANTIZE"}
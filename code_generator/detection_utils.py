@@ -18,6 +18,8 @@
 
 import json
 
+from .ModelGraph import ModelGraph
+
 
 class detectionUtils:
     def __init__(self, layers, det_config_path) -> None:
@@ -48,22 +50,23 @@ class detectionUtils:
         zerostring = "    int8_t y_zero" + f"[{str(len(self.det_conf))}]" + "={"
         scalestring = "    float y_scale" + f"[{str(len(self.det_conf))}]" + "={"
         top_avaialble_addrees = 0
+        graph = ModelGraph(self.layers)
         for key in self.det_conf:
             output_config = self.det_conf[key]
             # Find out the op that gerneate this output
             target_id = output_config["input_id"]
-            for layer in self.layers:
-                if str(layer.params["output_idx"]) == str(target_id):
-                    print(f"Processing the output {layer.params['output_idx']} as a detection feature map.")
-                    tensorstring += (
-                        f"{layer._getBufferstr(layer.params['output_buf_add'], layer.params['output_buf_add_offset'])},"
-                    )
-                    zerostring += f'{layer.params["output_zero_point"]},'
-                    scalestring += f'{layer.params["output_scale"]},'
-                    output_ch = layer.params["output_c"]
-                    top_avaialble_addrees = max(
-                        top_avaialble_addrees, layer.params["output_buf_add_offset"] + layer.output_tensors[0].len()
-                    )
+            layer = graph.producerOf(target_id)
+            if layer is not None:
+                print(f"Processing the output {layer.params['output_idx']} as a detection feature map.")
+                tensorstring += (
+                    f"{layer._getBufferstr(layer.params['output_buf_add'], layer.params['output_buf_add_offset'])},"
+                )
+                zerostring += f'{layer.params["output_zero_point"]},'
+                scalestring += f'{layer.params["output_scale"]},'
+                output_ch = layer.params["output_c"]
+                top_avaialble_addrees = max(
+                    top_avaialble_addrees, layer.params["output_buf_add_offset"] + layer.output_tensors[0].len()
+                )
 
         import math
 
@@ -1,8 +1,10 @@
 __all__ = [
     "add",
     "avgpool2d",
+    "concat",
     "conv2d",
     "depthwiseConv2d",
     "upsample",
     "maxpool2d",
+    "pad",
 ]
@@ -148,6 +148,15 @@ sprintf(buf, \""""
         else:
             raise NotImplementedError
 
+    def _getScratchstr(self, name):
+        # per-layer scratch buffer (sbuf/kbuf) placed with the activations, or the one shared by all layers
+        if f"{name}_buf_add_offset" in self.params:
+            if self.params[f"{name}_buf_add_offset"] is None:
+                # the layer does not need this scratch buffer
+                return "NULL"
+            return f"(q15_t *)&buffer0[{self.params[name + '_buf_add_offset']}]"
+        return name
+
     def _getBufferstrCast(self, location, offset, dtype="float32"):
         ret = ""
 
@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   concat.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import warnings
+
+import numpy as np
+
+from .basic_utils import basicOperator, deep_copy_dicts, overwrite_dicts
+
+__all__ = ["Concat"]
+
+default_params = {
+    # op related
+    "op": "CONCATENATION",
+    "input_idx": None,
+    "input2_idx": None,
+    "input3_idx": None,
+    "output_idx": None,
+    # concatenated axis of NHWC: 1 (h), 2 (w) or 3 (c)
+    "axis": None,
+    # the producers write into the slices of the output, no code for this layer, see GeneralMemoryScheduler
+    "inplace": False,
+    # tensor related
+    "input_dim": None,
+    "input_h": None,
+    "input_w": None,
+    "input_c": None,
+    "input2_dim": None,
+    "input2_h": None,
+    "input2_w": None,
+    "input2_c": None,
+    "input3_dim": None,
+    "input3_h": None,
+    "input3_w": None,
+    "input3_c": None,
+    "output_dim": None,
+    "output_h": None,
+    "output_w": None,
+    "output_c": None,
+    "input_dtype": "int8",
+    "input2_dtype": "int8",
+    "input3_dtype": "int8",
+    "output_dtype": "int8",
+}
+
+# prefixes of the params of each input
+INPUT_PREFIXES = ("input", "input2", "input3")
+
+
+class Concat(basicOperator):
+    def __init__(self, params: dict) -> None:
+        self.params = deep_copy_dicts(default_params)
+        overwrite_dicts(self.params, params)
+        super().__init__()
+        # handle input/output tensors in HWC format
+        for prefix in INPUT_PREFIXES:
+            if self.params[f"{prefix}_idx"] is None:
+                continue
+            self._add_input(
+                self.params[f"{prefix}_idx"],
+                self.params[f"{prefix}_dtype"],
+                self.params[f"{prefix}_c"],
+                self.params[f"{prefix}_w"],
+                self.params[f"{prefix}_h"],
+            )
+        self._add_output(
+            self.params["output_idx"],
+            self.params["output_dtype"],
+            self.params["output_c"],
+            self.params["output_w"],
+            self.params["output_h"],
+        )
+
+        if None in default_params:
+            warnings.warn(f"parameters are not all set for op {self.params['op']}")
+
+    def sliceOffsets(self):
+        """Return the byte offset of each input in the output if all of them are contiguous slices, otherwise None.
+
+        With batch 1 and HWC layout, the slices are contiguous if all dimensions before the axis are 1. The slices
+        also have to start at word-aligned offsets like all other tensors.
+        """
+        p = self.params
+        if p["axis"] == 3 and (p["output_h"] != 1 or p["output_w"] != 1):
+            return None
+        if p["axis"] == 2 and p["output_h"] != 1:
+            return None
+        offsets = [0]
+        for t in self.input_tensors[:-1]:
+            offsets.append(offsets[-1] + int(np.prod(t.size)) * t.byte_size[t.dtype])
+        if any(offset % 4 != 0 for offset in offsets):
+            return None
+        return offsets
+
+    def _rowSizes(self):
+        """Return the number of rows, i.e., the product of the dimensions before the axis, and the bytes per row of
+        each input and of the output."""
+        p = self.params
+        outer = {1: 1, 2: p["output_h"], 3: p["output_h"] * p["output_w"]}[p["axis"]]
+        tensors = self.input_tensors + self.output_tensors
+        return outer, [int(np.prod(t.size)) * t.byte_size[t.dtype] // outer for t in tensors]
+
+    def generate_inference_str(self):
+        params = self.params
+        if params["inplace"]:
+            return ""
+        if params["axis"] == 3 and len(self.input_tensors) == 2:
+            string = f"concat_ch({self._getBufferstr(params['input_buf_add'], params['input_buf_add_offset'])}, "
+            string += f"{str(params['input_w'])}, {str(params['input_h'])}, {str(params['input_c'])}, "
+            string += f"{self._getBufferstr(params['input2_buf_add'], params['input2_buf_add_offset'])}, "
+            string += f"{str(params['input2_c'])}, "
+            string += f"{self._getBufferstr(params['output_buf_add'], params['output_buf_add_offset'])});\n"
+            return string
+
+        # other shapes: copy each input into its slice of every row of the output
+        outer, sizes = self._rowSizes()
+        input_sizes, output_size = sizes[:-1], sizes[-1]
+        string = ""
+        row_offset = 0
+        for prefix, input_size in zip(INPUT_PREFIXES, input_sizes):
+            input_str = self._getBufferstr(params[f"{prefix}_buf_add"], params[f"{prefix}_buf_add_offset"])
+            string += f"concat_slice({input_str}, {outer}, {input_size}, "
+            string += f"{self._getBufferstr(params['output_buf_add'], params['output_buf_add_offset'] + row_offset)}, "
+            string += f"{output_size});\n"
+            row_offset += input_size
+
+        return string
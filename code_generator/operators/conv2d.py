@@ -20,6 +20,9 @@ import warnings
 
 from .basic_utils import basicOperator, deep_copy_dicts, overwrite_dicts
 
+# input channels with an unrolled 1x1 conv kernel, used with aggressive unrolling
+UNROLLED_INPUT_CHANNELS = (8, 16, 24, 48)
+
 __all__ = ["Conv2d"]
 
 default_params = {
@@ -144,6 +147,9 @@ class Conv2d(basicOperator):
     ):
         string = ""
         params = self.params
+        # 1x1 conv fused with a residual add, see LayerFusion
+        if params.get("input2_idx") is not None:
+            return self._generateResidualAddStr(fp_requantize)
         # floating point implmenetation
         kernel_h = params["kernel_h"]
         # function name
@@ -160,7 +166,7 @@ class Conv2d(basicOperator):
                 else:
                     function_name = "convolve_1x1_s8_oddch"
             else:
-                if use_aggressive_unroll and params["input_c"] in [8, 16, 24, 48]:
+                if use_aggressive_unroll and params["input_c"] in UNROLLED_INPUT_CHANNELS:
                     function_name = f"convolve_1x1_s8_ch{str(params['input_c'])}"
                 else:
                     if (
@@ -216,14 +222,14 @@ class Conv2d(basicOperator):
         string += f"{str(params['output_w'])},{str(params['output_h'])},{str(params['output_c'])},"
 
         # intemediate buffers
-        string += "sbuf"
+        string += self._getScratchstr("sbuf")
         if (
             kernel_h == 3
             and params["stride_h"] == 2
             and params["padding"] == 1
             and not ("is_patch" in params and params["is_patch"])
         ):
-            string += ",kbuf"
+            string += f",{self._getScratchstr('kbuf')}"
 
         # pad value for kernel size > 1
         if kernel_h > 1:
@@ -256,3 +262,26 @@ class Conv2d(basicOperator):
             )
 
         return string
+
+    def _generateResidualAddStr(self, fp_requantize):
+        params = self.params
+        if not fp_requantize:
+            raise NotImplementedError("conv fused with a residual add is only supported with fp_requantize")
+        parsed_idx = str(params["parsed_trainable"])
+        string = (
+            f"convolve_1x1_s8_fpreq_add({self._getBufferstr(params['input_buf_add'], params['input_buf_add_offset'])},"
+        )
+        string += f"{str(params['input_w'])},{str(params['input_h'])},{str(params['input_c'])},"
+        string += f"(const q7_t*) weight{parsed_idx},bias{parsed_idx},scales{parsed_idx},"
+        string += f"{str(params['conv_output_zero_point'])},{str(params['input_zero_point'] * -1)},-128,127,"
+        # residual and the quantization of the add
+        string += f"{self._getBufferstr(params['input2_buf_add'], params['input2_buf_add_offset'])},"
+        string += (
+            f"{str(params['conv_output_scale'])},{str(params['input2_scale'])},{str(params['input2_zero_point'])},"
+        )
+        string += f"{str(params['output_scale'])},{str(params['output_zero_point'])},"
+        string += f"{self._getBufferstr(params['output_buf_add'], params['output_buf_add_offset'])},"
+        string += f"{str(params['output_w'])},{str(params['output_h'])},{str(params['output_c'])},"
+        string += f"{self._getScratchstr('sbuf')});\n"
+
+        return string
@@ -166,7 +166,7 @@ class DepthwiseConv2d(basicOperator):
         )
 
         # intemediate buffers
-        string += "sbuf,"
+        string += f"{self._getScratchstr('sbuf')},"
 
         # padding value
         string += f"{str(params['input_zero_point'])}"
@@ -178,7 +178,7 @@ class DepthwiseConv2d(basicOperator):
                 stride_string = str(params["stride_h"])
                 string += (
                     f"pad_t /= {stride_string};pad_b /= {stride_string};"
-                    + "pad_l /= {stride_string};pad_r /= {stride_string};\n"
+                    + f"pad_l /= {stride_string};pad_r /= {stride_string};\n"
                 )
             else:
                 string += (
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------
+# Project: TinyEngine
+# Title:   pad.py
+#
+# Reference papers:
+#  - MCUNet: Tiny Deep Learning on IoT Device, NeurIPS 2020
+#  - MCUNetV2: Memory-Efficient Patch-based Inference for Tiny Deep Learning, NeurIPS 2021
+#  - MCUNetV3: On-Device Training Under 256KB Memory, arXiv:2206.15472
+# Contact authors:
+#  - Wei-Ming Chen, wmchen@mit.edu
+#  - Wei-Chen Wang, wweichen@mit.edu
+#  - Ji Lin, jilin@mit.edu
+#  - Ligeng Zhu, ligeng@mit.edu
+#  - Song Han, songhan@mit.edu
+#
+# Target ISA:  ARMv7E-M
+# ----------------------------------------------------------------------
+
+import warnings
+
+from .basic_utils import basicOperator, deep_copy_dicts, overwrite_dicts
+
+__all__ = ["Pad"]
+
+
+default_params = {
+    # op related
+    "op": "PAD",
+    "input_idx": None,
+    "output_idx": None,
+    "pad_t": None,
+    "pad_b": None,
+    "pad_l": None,
+    "pad_r": None,
+    # tensor related
+    "input_dim": None,
+    "input_h": None,
+    "input_w": None,
+    "input_c": None,
+    "output_dim": None,
+    "output_h": None,
+    "output_w": None,
+    "output_c": None,
+    "input_dtype": "int8",
+    "output_dtype": "int8",
+    # quantization related, the padded value
+    "input_zero_point": None,
+}
+
+
+class Pad(basicOperator):
+    def __init__(self, params: dict) -> None:
+        self.params = deep_copy_dicts(default_params)
+        overwrite_dicts(self.params, params)
+        super().__init__()
+        # handle input/output tensors in HWC format
+        self._add_input(
+            self.params["input_idx"],
+            self.params["input_dtype"],
+            self.params["input_c"],
+            self.params["input_w"],
+            self.params["input_h"],
+        )
+        self._add_output(
+            self.params["output_idx"],
+            self.params["output_dtype"],
+            self.params["output_c"],
+            self.params["output_w"],
+            self.params["output_h"],
+        )
+
+        if None in default_params:
+            warnings.warn(f"parameters are not all set for op {self.params['op']}")
+
+    def generate_inference_str(self):
+        params = self.params
+        string = f"pad_hw({self._getBufferstr(params['input_buf_add'], params['input_buf_add_offset'])}, "
+        string += f"{str(params['input_h'])}, {str(params['input_w'])}, {str(params['input_c'])}, "
+        string += f"{str(params['pad_t'])}, {str(params['pad_b'])}, {str(params['pad_l'])}, {str(params['pad_r'])}, "
+        string += f"{str(params['input_zero_point'])}, "
+        string += f"{self._getBufferstr(params['output_buf_add'], params['output_buf_add_offset'])});\n"
+
+        return string
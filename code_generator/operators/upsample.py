@@ -58,16 +58,16 @@ class upSample(basicOperator):
         self._add_input(
             self.params["input_idx"],
             self.params["input_dtype"],
-            self.params["input_h"],
-            self.params["input_w"],
             self.params["input_c"],
+            self.params["input_w"],
+            self.params["input_h"],
         )
         self._add_output(
             self.params["output_idx"],
             self.params["output_dtype"],
-            self.params["output_h"],
-            self.params["output_w"],
             self.params["output_c"],
+            self.params["output_w"],
+            self.params["output_h"],
         )
 
         if None in default_params: